@@ -1,24 +1,35 @@
+import os
 import sys
 import shutil
 import signal
 import time
 import cv2
 import numpy as np
-from picamera.array import PiRGBArray
-from picamera import PiCamera
 
 import utils
 from .file_controller import ROOT_PATH, AUDIO_PATH
 from .image_processor import NPImage
 from .speech_service import SpeechService, Responser
-from .detector import detect, BoundingBox
-from .obstacle_dodge_service import Dodger, Maze, generate_maze, PathNotFoundError
-from .distance_measurementor import Calibrationor, Measurementor
+from .detector import detect, last_timings, BoxArray
+from .obstacle_dodge_service import GridDodger, IncrementalDodger, PlanCache
+from .obstacle_dodge_service import Maze, generate_grid, PathNotFoundError
+from .distance_measurementor import Calibrationor, Measurementor, GroundPlane
+from .distance_measurementor import measure_distances, bearing_angles
 from .environmental_model import create_environmental_model, disconnect_environmental_model_socket
-from .guardianship_service import GuardianshipService
-from .sensor_module import SensorService, HCSR04, GPS, MPU6050
-from .sensor_module import Buzzer, Frequency, EmergencyButton, destroy_sensors
+# from .guardianship_service import GuardianshipService
+from .frame_source import open_frame_source
+from .preview_server import PreviewServer
+from .pipeline import Pipeline, StageQueue, DropPolicy, FramePacket, PipelineClosedError
+from .tracer import Tracer
+from .object_tracker import TrackedDetector
+from .motion_gate import MotionGate
 # from .beacon_scanner import BeaconScanner
+try:
+    from .sensor_module import SensorService, HCSR04, GPS, MPU6050
+    from .sensor_module import Buzzer, Frequency, EmergencyButton, destroy_sensors
+except ImportError:
+    # RPi.GPIO、smbus 等硬體套件只存在於樹莓派上，離線測試時略過
+    SensorService = None
 # from .chatbot.chatbot_client import ChatbotClient
 
 
@@ -28,93 +39,249 @@ _FRAME_SIZE = (960, 720)
 _FRAME_RATE = 50
 _VIDEO_RATE = 20
 _RESOLUTION = 60
+_MAX_CUE_AGE = 1.0
+_DETECT_INTERVAL = 3
+_CLEARANCE_WEIGHT = 2.
+_TRACE_PATH = f'{ROOT_PATH}/data/latency.json'
+_GROUND_PLANE_PATH = f'{ROOT_PATH}/data/ground_plane.json'
+_CALIBRATION_PATH = f'{ROOT_PATH}/data/calibration.json'
 utils.initialize_vars()
 
 # _CHATBOT_CLIENT = ChatbotClient(port = '/dev/ttyAMA0')
 
-def initialize():
-    camera = PiCamera()
-    camera.resolution = _FRAME_SIZE
-    camera.framerate = _FRAME_RATE
-    raw_capture = PiRGBArray(camera)
+def initialize(source = None, max_speed = False, max_frames = None, hardware = True,
+               headless = False, preview_port = None, tracer = None,
+               detect_interval = _DETECT_INTERVAL, motion_gate = True,
+               ground_plane = _GROUND_PLANE_PATH, calibration = _CALIBRATION_PATH,
+               planner = 'astar'):
+    """Run the guidance loop. `source` selects the frame source (None
+       for the Pi camera, a device index, a directory of images or a
+       recorded video); with `hardware` disabled the speech service,
+       sensors and audio cues are skipped so the detection and planning
+       path can be benchmarked off-device. `headless` drops the cv2
+       window and all annotation drawing; `preview_port` starts an
+       MJPEG preview that only draws while a client is watching.
+       Per-stage latencies are collected by `tracer` and reported on
+       SIGUSR1 and at shutdown. The detector runs every
+       `detect_interval` frames and a tracker fills in the rest; with
+       `motion_gate` enabled static scenes reuse the previous detections
+       and plan, for at most MotionGate's staleness bound. When a
+       `ground_plane` calibration file exists, distance and bearing are
+       looked up from each box's bottom edge instead of its width;
+       otherwise a `calibration` file provides per-class sizes for the
+       width-based estimate. `planner` is 'astar', 'bfs', 'incremental'
+       (D* Lite, repairs the previous frame's plan) or 'clearance' (A*
+       on a cost map that keeps the path away from obstacles)."""
+    frame_source = open_frame_source(source, resolution = _FRAME_SIZE,
+        framerate = _FRAME_RATE, max_speed = max_speed, max_frames = max_frames)
     # out = cv2.VideoWriter(
     #     f'output_{time.strftime("%Y%m%d-%H%M", time.localtime())}.mp4', 
     #     cv2.VideoWriter_fourcc(*'XVID'), _VIDEO_RATE, _FRAME_SIZE)
-    time.sleep(0.1)
 
-    def _truncate_frame():
-        cv2.waitKey(1) & 0xFF
-        raw_capture.truncate(0)
-
-    _signal_handle()
-    _init_services()
-    _enable_sensors()
+    if hardware:
+        _init_services()
+        _enable_sensors()
     # _DICT_SERVICE['GuardianshipService'].mpu = _DICT_SENSORS['MPU6050']
     # _DICT_SERVICE['GuardianshipService'].buzzer = _DICT_SENSORS['Buzzer']
     
-    dodger = Dodger()
+    # 連續幾幀的迷宮常常完全相同，直接沿用快取的路徑
+    dodger = PlanCache(_make_planner(planner))
+    ground = _load_ground_plane(ground_plane)
+    measurementor = _load_calibration(calibration)
     resp = Responser()
-    
-    for frame in camera.capture_continuous(raw_capture, format='bgr', use_video_port=True):
-        frame = frame.array
-        result, dets = detect(frame)
-
+    tracer = tracer or Tracer()
+    detector = TrackedDetector(detect, interval = detect_interval)
+    gate = MotionGate() if motion_gate else None
+    last_detection = {}
+    last_plan = {}
+    started = time.monotonic()
+    display = StageQueue(maxsize = 1, policy = DropPolicy.DROP_OLDEST)
+    preview = None
+    if preview_port:
+        preview = PreviewServer(port = preview_port)
+        preview.start()
+
+    def _should_draw():
+        return not headless or (preview is not None and preview.has_clients)
+
+    def _capture():
+        frames = frame_source.frames()
+        while True:
+            start = time.monotonic()
+            frame = next(frames, None)
+            if frame is None: return
+
+            packet = FramePacket(index = frame.index, frame = frame.image,
+                                 timestamp = frame.timestamp)
+            tracer.mark('capture', start, packet.marks)
+            yield packet
+
+    def _infer(packet):
+        packet.draw = _should_draw()
+        if last_detection and gate is not None and \
+                not gate.should_process(packet.frame, packet.timestamp):
+            packet.reused = True
+            packet.result = last_detection['result']
+            packet.dets = last_detection['dets']
+            return packet
+
+        with tracer.span('detect', packet.marks):
+            packet.result, packet.dets, detected = detector(
+                packet.frame, draw = packet.draw)
+        if detected:
+            for stage, seconds in last_timings().items():
+                tracer.record(stage, seconds, packet.marks)
+        last_detection.update(result = packet.result, dets = packet.dets)
+        return packet
+
+    def _finish(packet):
+        tracer.finish(packet.index, packet.marks)
+        return None
+
+    def _plan(packet):
+        result = packet.result
         h = result.shape[0]
         w = result.shape[1]
 
-        bboxes = []
-        bboxes += _find_contours(result, threshold = int((h / 4) * (w / 4)))
-        if dets or bboxes:
-            bboxes = _calc_distance(result, dets, bboxes)
-            bboxes = _calc_angle(result, bboxes)
-            '''
-            create_environmental_model(
-                file_path = f'{ROOT_PATH}/data/environmentalModel.json',
-                image = result, resolution = _RESOLUTION, bboxes = bboxes)
-            '''
-
-        cv2.namedWindow('result', cv2.WINDOW_NORMAL)
-        cv2.imshow('result', result)
+        # 場景沒有變化時沿用上一次的偵測與路徑規劃結果
+        reuse = packet.reused and bool(last_plan)
+        if reuse:
+            bboxes = last_plan['bboxes']
+        else:
+            with tracer.span('contours', packet.marks):
+                # 輪廓要在未標註的原始影格上找，結果才不受是否繪圖影響
+                bboxes = _find_contours(packet.frame, threshold = int((h / 4) * (w / 4)),
+                                        draw = packet.draw, canvas = result)
+            if packet.dets or bboxes:
+                with tracer.span('distance_angle', packet.marks):
+                    bboxes = _calc_distance(result, packet.dets, bboxes, draw = packet.draw,
+                                            ground = ground, measurementor = measurementor)
+                    bboxes = _calc_angle(result, bboxes, draw = packet.draw, ground = ground)
+                '''
+                create_environmental_model(
+                    file_path = f'{ROOT_PATH}/data/environmentalModel.json',
+                    image = result, resolution = _RESOLUTION, bboxes = bboxes)
+                '''
+            last_plan.update(bboxes = bboxes, maze = None, dirs = None, cue = None)
+
+        if not headless: display.put(result)
+        if preview is not None: preview.publish(result)
         # out.write(result)
 
-        utils.GLOBAL_IMAGE = frame
+        packet.bboxes = bboxes
+        utils.GLOBAL_IMAGE = packet.frame
         utils.GLOBAL_DATASET = bboxes
         # utils.GLOBAL_LATLNG.latitude = _DICT_SENSORS['GPS'].latitude
         # utils.GLOBAL_LATLNG.longitude = _DICT_SENSORS['GPS'].longitude
-        hcsr04_distance = _DICT_SENSORS['HCSR04'].distance
+        hcsr04 = _DICT_SENSORS.get('HCSR04')
+        hcsr04_distance = hcsr04.distance if hcsr04 else None
 
         if hcsr04_distance and float(hcsr04_distance) < 50:
-            res_audio_file = resp.decide_response(f'stop,{float(hcsr04_distance)}')
-            resp.play_audio(res_audio_file)
             # _CHATBOT_CLIENT.send('stop')
-            _DICT_SENSORS['Buzzer'].buzz(Frequency.ALERT, 0.2, 1)
-            
-            _truncate_frame()
-            continue  
+            packet.cue = (f'stop,{float(hcsr04_distance)}', True)
+            return packet
+
+        if reuse:
+            packet.maze = last_plan['maze']
+            packet.dirs = last_plan['dirs']
+            packet.cue = last_plan['cue']
+            return packet if packet.cue else _finish(packet)
         
         if bboxes:
             h = int(result.shape[0] / 2)
-            maze = generate_maze(data = bboxes, height = h, width = w,
-                benchmark = h, resolution = _RESOLUTION)
-            maze = Maze(maze)
+            with tracer.span('maze', packet.marks):
+                # 最近的障礙物排在最前面，提示使用 bboxes[0] 的距離
+                bboxes.sort_by('distance')
+                # 格子緩衝區會被下一幀重複使用，保留給 last_plan 的需要複製
+                maze = Maze(generate_grid(data = bboxes, height = h, width = w,
+                    benchmark = h, resolution = _RESOLUTION).copy())
 
             try:
-                dirs = dodger.solve(maze)
+                with tracer.span('solve', packet.marks):
+                    dirs = dodger.solve(maze)
             except (PathNotFoundError, IndexError) as err:
-                _truncate_frame()
                 print(err)
-                continue     
+                return _finish(packet)
 
             print(maze)
             print(dirs)
-            res_audio_file = resp.decide_response(f'{dirs[0]},{bboxes[0].distance}')
-            resp.play_audio(res_audio_file)
+            packet.maze = maze
+            packet.dirs = dirs
             # _CHATBOT_CLIENT.send(dirs[0])
+            packet.cue = (f'{dirs[0]},{bboxes[0].distance}',
+                          dirs[0] in ('v', 'stop'))
+            last_plan.update(maze = maze, dirs = dirs, cue = packet.cue)
+            return packet
+
+        return _finish(packet)
+
+    def _dispatch(packet):
+        # 過期的提示直接丟棄，避免播放已經不符合現況的語音
+        if time.monotonic() - packet.timestamp > _MAX_CUE_AGE:
+            return _finish(packet)
+
+        keyword, alert = packet.cue
+        res_audio_file = resp.decide_response(keyword)
+        tracer.record('photon_to_speech',
+            time.monotonic() - packet.timestamp, packet.marks)
+        if not hardware:
+            utils.GLOBAL_LOGGER.info(f'cue: {res_audio_file}')
+            return _finish(packet)
+
+        with tracer.span('cue', packet.marks):
+            resp.play_audio(res_audio_file)
 
-            if dirs[0] in ('v', 'stop'):
+            if alert:
                 _DICT_SENSORS['Buzzer'].buzz(Frequency.ALERT, 0.2, 1)
-        
-        _truncate_frame()
+
+        return _finish(packet)
+
+    pipeline = Pipeline(stages = [
+        ('capture', _capture),
+        ('inference', _infer),
+        ('planning', _plan),
+        ('cue', _dispatch)
+    ])
+    def _stop():
+        pipeline.stop()
+        if preview is not None: preview.stop()
+        utils.GLOBAL_LOGGER.info('\n' + tracer.dump(_TRACE_PATH))
+
+    _signal_handle(on_exit = _stop, on_report = lambda: \
+        utils.GLOBAL_LOGGER.info('\n' + tracer.dump()))
+    pipeline.start()
+
+    while headless and pipeline.is_alive():
+        pipeline.join(timeout = 0.5)
+
+    # cv2 的視窗操作必須在主執行緒中進行
+    while not headless and pipeline.is_alive():
+        try:
+            result = display.get(timeout = 0.5)
+        except PipelineClosedError:
+            break
+        if result is None:
+            continue
+
+        cv2.namedWindow('result', cv2.WINDOW_NORMAL)
+        cv2.imshow('result', result)
+        cv2.waitKey(1) & 0xFF
+
+    _stop()
+    pipeline.join()
+
+    elapsed = time.monotonic() - started
+    stats = pipeline.stats()
+    for name, stat in stats.items():
+        utils.GLOBAL_LOGGER.info(f'{name}: {stat}')
+        if stat['errors']:
+            utils.GLOBAL_LOGGER.error(
+                f'{name} stage failed on {stat["errors"]} frames, see the tracebacks above.')
+    utils.GLOBAL_LOGGER.info(f'plan cache: {dodger.stats()}')
+    utils.GLOBAL_LOGGER.info(
+        f'{stats["planning"]["processed"] / elapsed:.2f} FPS over {elapsed:.2f}s')
+
+    return stats
 
 
 _DICT_SERVICE = {}
@@ -135,6 +302,9 @@ def _init_services():
 
 _DICT_SENSORS = {}
 def _enable_sensors():
+    if SensorService is None:
+        raise RuntimeError('sensor modules are not available on this platform.')
+
     sensors = [
         HCSR04(trigger_pin=23, echo_pin=24),
         # GPS(port='/dev/ttyAMA0'),
@@ -159,83 +329,104 @@ def _enable_sensors():
     # utils.GLOBAL_LOGGER.info(f'{utils.get_type_name(_DICT_SENSORS["EmergencyButton"])} is enabled.')
 
 def _generate_bboxes(dets):
-    return [BoundingBox(det) for det in dets]
-
-def _calc_distance(frame, dets, bboxes):
+    return BoxArray.from_dets(dets)
+
+def _make_planner(planner):
+    if planner == 'incremental':
+        return IncrementalDodger()
+    if planner == 'clearance':
+        return GridDodger(clearance = _CLEARANCE_WEIGHT)
+    return GridDodger(planner)
+
+def _load_ground_plane(path):
+    if not path or not os.path.exists(path): return None
+
+    ground = GroundPlane.load(path)
+    if ground.image_size != _FRAME_SIZE:
+        # 查表以校正時的影像尺寸建立，換算成實際影格尺寸後才能使用
+        utils.GLOBAL_LOGGER.info(
+            f'Ground plane was calibrated at {ground.image_size}, scaling it to {_FRAME_SIZE}.')
+        ground = ground.resized(_FRAME_SIZE)
+    utils.GLOBAL_LOGGER.info(f'Ground plane model loaded from {path}.')
+    return ground
+
+def _load_calibration(path):
+    if not path or not os.path.exists(path): return None
+
+    measurementor = Measurementor.load(path)
+    utils.GLOBAL_LOGGER.info(
+        f'Calibration for {len(measurementor.sizes)} classes loaded from {path}.')
+    return measurementor
+
+def _calc_distance(frame, dets, bboxes, draw = True, ground = None, measurementor = None):
     h = frame.shape[0]
     w = frame.shape[1]
 
-    bboxes += _generate_bboxes(dets)
-    bboxes = [bbox for bbox in bboxes
-              if bbox.coordinates.lb.y >= int(h / 2)]
-    bboxes = [bbox for bbox in bboxes
-              if bbox.width * bbox.height >= int((h / 4) * (w / 4))]
-
-    for bbox in bboxes:
-        distance = _measure_distance(_CALIBRATION_DISTANCE, _FOCALLEN, bbox)
-        distance = 1.2687 * distance + 4.5514 # 利用迴歸線校正距離
-        distance = round(distance, 2)
-        bbox.distance = distance
-        x = int(bbox.center()[0] - bbox.width / 4)
-        y = int(bbox.coordinates.lt.y - 10)
-        cv2.putText(frame, text=f'{distance}cm', org=(x, y),
-                    fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.50, 
-                    color=(0, 0, 255), thickness=2)
+    bboxes = bboxes.concat(_generate_bboxes(dets))
+    bboxes = bboxes[(bboxes.bottom >= int(h / 2))
+                    & (bboxes.area >= int((h / 4) * (w / 4)))]
+
+    if ground is not None:
+        # 以框的底邊查表得到地面距離
+        bboxes.distance = np.round(ground.distance(bboxes.bottom), 2)
+    else:
+        # 一次計算所有框的距離 (含迴歸線校正)
+        distance = measure_distances(bboxes.width, bboxes.height,
+                                     _FOCALLEN, _CALIBRATION_DISTANCE)
+        if measurementor is not None:
+            # 有校準尺寸的類別改用針孔模型，其餘 (如輪廓) 維持原本的估計
+            calibrated = measurementor.measure_classes(bboxes.class_names, bboxes.width)
+            distance = np.where(np.isnan(calibrated), distance, np.round(calibrated, 2))
+        bboxes.distance = distance
+    if draw:
+        for x, y, distance in zip((bboxes.x_center - bboxes.width / 4).astype(int).tolist(),
+                                  (bboxes.top - 10).tolist(), bboxes.distance.tolist()):
+            cv2.putText(frame, text=f'{distance}cm', org=(x, y),
+                        fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.50, 
+                        color=(0, 0, 255), thickness=2)
 
     return bboxes
 
-def _measure_distance(calibration_distance, focallen, bbox):
-    rad = bbox.width
-    size = bbox.minEnclosingCircle()
-
-    measurementor = Measurementor(focallen)
-    distance = measurementor.measure(size, rad)
-
-    if distance < calibration_distance:
-        distance = calibration_distance + distance
-
-    return distance
-
-def _calc_angle(frame, bboxes):
+def _calc_angle(frame, bboxes, draw = True, ground = None):
     h = frame.shape[0]
     w = frame.shape[1]
 
-    for bbox in bboxes:
-        v2_x, v2_y = bbox.center()
-        v1 = np.array([w / 2, h])
-        v2 = np.array([v2_x, v2_y])
-        line_v1 = np.sqrt(v1.dot(v1))
-        line_v2 = np.sqrt(v2.dot(v2))
-
-        cos_angle = v1.dot(v2) / (line_v1 * line_v2)
-        angle = np.arccos(cos_angle)
-        angle = round(angle * 360 / 2 / np.pi, 1)
-        bbox.angle = angle
-        
-        x = int(v2_x - bbox.width / 4)
-        y = int(bbox.coordinates.lt.y - 25)
-        cv2.putText(frame, text=f'{angle}°', org=(x, y),
-                    fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.50, 
-                    color=(0, 0, 255), thickness=2)
+    # angle 一律沿用原本的無號角度，地面模型的有號方位角另存於 bearing
+    bboxes.angle = bearing_angles(bboxes.x_center, bboxes.y_center, w, h)
+    if ground is not None:
+        bboxes.bearing = np.round(ground.bearing(bboxes.x_center), 1)
+    if draw:
+        for x, y, angle in zip((bboxes.x_center - bboxes.width / 4).astype(int).tolist(),
+                               (bboxes.top - 25).tolist(), bboxes.angle.tolist()):
+            cv2.putText(frame, text=f'{angle}°', org=(x, y),
+                        fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.50, 
+                        color=(0, 0, 255), thickness=2)
     
     return bboxes
 
-def _find_contours(frame, threshold = 30):
+def _find_contours(frame, threshold = 30, draw = True, canvas = None):
+    """Boxes around large contours of `frame`; when `draw`, they are drawn
+       on `canvas` (default `frame`)."""
     dets = []
+    canvas = frame if canvas is None else canvas
 
     for cnt in NPImage(frame).find_contours():
         area = cv2.contourArea(cnt)
         if area >= threshold:
             x, y, w, h = cv2.boundingRect(cnt)
             dets.append(('unknown', 1, (x, y, x + w, y + h)))
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            if draw: cv2.rectangle(canvas, (x, y), (x + w, y + h), (0, 255, 0), 2)
 
     return _generate_bboxes(dets)
 
-def _signal_handle():
+def _signal_handle(on_exit = None, on_report = None):
+    def _report(signal, frame):
+        if callable(on_report): on_report()
+
     def _handler(signal, frame):
+        if callable(on_exit): on_exit()
         cv2.destroyAllWindows()
-        destroy_sensors()
+        if _DICT_SENSORS: destroy_sensors()
         disconnect_environmental_model_socket()
         # _DICT_SERVICE['GuardianshipService'].stop()
         # _CHATBOT_CLIENT.close()
@@ -243,4 +434,6 @@ def _signal_handle():
         sys.exit(0)
 
     signal.signal(signal.SIGINT, _handler)
-    signal.signal(signal.SIGTERM, _handler)
\ No newline at end of file
+    signal.signal(signal.SIGTERM, _handler)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, _report)
\ No newline at end of file
@@ -1,8 +1,41 @@
 import os, sys
+import argparse
 
 if not __package__:
   path = os.path.join(os.path.dirname(__file__), os.pardir)
   sys.path.insert(0, path)
-  
+
+parser = argparse.ArgumentParser(prog = 'aidel')
+parser.add_argument('--source', default = None,
+  help = 'camera index, image directory or video file (default: PiCamera)')
+parser.add_argument('--max-speed', action = 'store_true',
+  help = 'replay recorded sources as fast as possible')
+parser.add_argument('--max-frames', type = int, default = None)
+parser.add_argument('--no-hardware', action = 'store_true',
+  help = 'skip speech service, sensors and audio cues')
+parser.add_argument('--headless', action = 'store_true',
+  help = 'no preview window and no annotation drawing')
+parser.add_argument('--preview-port', type = int, default = None,
+  help = 'serve an MJPEG preview on this port')
+parser.add_argument('--detect-interval', type = int, default = 3,
+  help = 'run the detector every N frames and track in between')
+parser.add_argument('--no-motion-gate', action = 'store_true',
+  help = 'run detection even when the scene has not changed')
+parser.add_argument('--ground-plane', default = None,
+  help = 'ground plane calibration file (default: data/ground_plane.json if present)')
+parser.add_argument('--calibration', default = None,
+  help = 'distance calibration file (default: data/calibration.json if present)')
+parser.add_argument('--planner', default = 'astar',
+  choices = ('astar', 'bfs', 'incremental', 'clearance'),
+  help = 'path planner; incremental repairs the previous plan (D* Lite), '
+         'clearance keeps the path away from obstacles')
+args = parser.parse_args()
+
 import aidel
-aidel.initialize()
\ No newline at end of file
+aidel.initialize(source = args.source, max_speed = args.max_speed,
+  max_frames = args.max_frames, hardware = not args.no_hardware,
+  headless = args.headless, preview_port = args.preview_port,
+  detect_interval = args.detect_interval, planner = args.planner,
+  motion_gate = not args.no_motion_gate,
+  **({'ground_plane': args.ground_plane} if args.ground_plane else {}),
+  **({'calibration': args.calibration} if args.calibration else {}))
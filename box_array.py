@@ -0,0 +1,286 @@
+import math
+import numpy as np
+from collections import namedtuple
+
+
+Point = namedtuple('Point', ['x', 'y'])
+Coordinates = namedtuple('Coordinates', ['lt', 'rt', 'lb', 'rb'])
+
+BOX_DTYPE = np.dtype([
+    ('cls', np.int32),
+    ('confidence', np.float32),
+    ('ltrb', np.int32, (4,)),
+    ('track_id', np.int32),
+    ('distance', np.float64),
+    ('angle', np.float64),
+    ('bearing', np.float64)
+])
+
+_NO_TRACK = -1
+
+# 類別名稱只在第一次出現時登錄，之後以整數編號存放在陣列中
+_class_names = []
+_class_ids = {}
+
+def class_id(name):
+    if name not in _class_ids:
+        _class_ids[name] = len(_class_names)
+        _class_names.append(name)
+    return _class_ids[name]
+
+def class_name(cls):
+    return _class_names[cls]
+
+
+class BoxArray:
+    """Columnar container for the boxes of one frame. Every box is a row
+       of a NumPy structured array (class id, confidence, ltrb, track id,
+       distance, angle) so the geometry stages can work on whole columns;
+       indexing with an int returns a BoundingBox view of that row, any
+       other index (slice, mask, index array) returns a new BoxArray.
+       Distance and angle are NaN until they are measured. `angle` is the
+       unsigned angle to the bottom center of the frame; `bearing` is the
+       signed horizontal bearing (negative to the left) and is only set
+       when a ground plane model is available."""
+
+    def __init__(self, data = None):
+        self._data = np.zeros(0, dtype = BOX_DTYPE) if data is None else data
+
+    @classmethod
+    def from_dets(cls, dets):
+        """Build from detector tuples (clsName, confidence, ltrb[, track_id])."""
+        data = np.zeros(len(dets), dtype = BOX_DTYPE)
+        data['track_id'] = _NO_TRACK
+        data['distance'] = data['angle'] = data['bearing'] = np.nan
+        for i, det in enumerate(dets):
+            data['cls'][i] = class_id(det[0])
+            data['confidence'][i] = det[1]
+            data['ltrb'][i] = det[2]
+            if len(det) > 3 and det[3] is not None:
+                data['track_id'][i] = det[3]
+        return cls(data)
+
+    @classmethod
+    def of(cls, boxes):
+        """Return `boxes` as a BoxArray; lists of BoundingBox are copied."""
+        if isinstance(boxes, BoxArray): return boxes
+        if not boxes: return cls()
+        return cls(np.concatenate([box.row for box in boxes]))
+
+    def concat(self, other):
+        return BoxArray(np.concatenate([self._data, BoxArray.of(other)._data]))
+
+    def __add__(self, other):
+        return self.concat(other)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __bool__(self):
+        return len(self._data) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0: index += len(self._data)
+            if not 0 <= index < len(self._data):
+                raise IndexError('box index out of range.')
+            return BoundingBox._view(self, int(index))
+        return BoxArray(self._data[index])
+
+    def __iter__(self):
+        for i in range(len(self._data)):
+            yield BoundingBox._view(self, i)
+
+    def __repr__(self):
+        return f'BoxArray({list(self)})'
+
+    def sort_by(self, field = 'distance'):
+        """Sort the rows in place (ascending, NaN last) by a column."""
+        self._data = self._data[np.argsort(self._data[field], kind = 'stable')]
+        return self
+
+    @property
+    def data(self):
+        return self._data
+
+    @property
+    def class_names(self):
+        return [_class_names[c] for c in self._data['cls']]
+
+    @property
+    def confidence(self):
+        return self._data['confidence']
+
+    @property
+    def ltrb(self):
+        return self._data['ltrb']
+
+    @property
+    def left(self):
+        return self._data['ltrb'][:, 0]
+
+    @property
+    def top(self):
+        return self._data['ltrb'][:, 1]
+
+    @property
+    def right(self):
+        return self._data['ltrb'][:, 2]
+
+    @property
+    def bottom(self):
+        return self._data['ltrb'][:, 3]
+
+    @property
+    def width(self):
+        return self.right - self.left
+
+    @property
+    def height(self):
+        return self.bottom - self.top
+
+    @property
+    def area(self):
+        return self.width * self.height
+
+    @property
+    def x_center(self):
+        return self.left + self.width / 2
+
+    @property
+    def y_center(self):
+        return self.top + self.height / 2
+
+    def min_enclosing_circle(self):
+        return np.ceil(np.hypot(self.width, self.height)).astype(int)
+
+    @property
+    def distance(self):
+        return self._data['distance']
+
+    @distance.setter
+    def distance(self, distance):
+        self._data['distance'] = distance
+
+    @property
+    def angle(self):
+        return self._data['angle']
+
+    @angle.setter
+    def angle(self, angle):
+        self._data['angle'] = angle
+
+    @property
+    def bearing(self):
+        return self._data['bearing']
+
+    @bearing.setter
+    def bearing(self, bearing):
+        self._data['bearing'] = bearing
+
+
+def _optional(value):
+    return None if not value or math.isnan(value) else float(value)
+
+
+class BoundingBox:
+    """Row view into a BoxArray, keeping the attribute interface the
+       rest of the code was written against. BoundingBox(det) still
+       works and wraps a one-row BoxArray."""
+
+    __slots__ = ('_boxes', '_index')
+
+    def __init__(self, det):
+        self._boxes = BoxArray.from_dets([det])
+        self._index = 0
+
+    @classmethod
+    def _view(cls, boxes, index):
+        view = cls.__new__(cls)
+        view._boxes = boxes
+        view._index = index
+        return view
+
+    def __repr__(self):
+        return (f'BoundingBox({self.clsName!r}, {self.confidence:.2f}, '
+                f'{tuple(int(c) for c in self._ltrb)})')
+
+    @property
+    def _row(self):
+        return self._boxes.data[self._index]
+
+    @property
+    def row(self):
+        """This box as a one-row structured array."""
+        return self._boxes.data[self._index:self._index + 1]
+
+    @property
+    def _ltrb(self):
+        return self._row['ltrb']
+
+    def minEnclosingCircle(self):
+        sqrt = (self.width ** 2) + (self.height ** 2)
+        return int(math.ceil(sqrt ** 0.5))
+
+    def center(self):
+        return self.xCenter, self.yCenter
+
+    @property
+    def clsName(self):
+        return _class_names[self._row['cls']]
+
+    @property
+    def confidence(self):
+        return self._row['confidence']
+
+    @property
+    def trackId(self):
+        track_id = int(self._row['track_id'])
+        return None if track_id == _NO_TRACK else track_id
+
+    @property
+    def coordinates(self):
+        l, t, r, b = (int(c) for c in self._ltrb)
+        return Coordinates(Point(l, t), Point(r, t), Point(l, b), Point(r, b))
+
+    @property
+    def xCenter(self):
+        l, _, r, _ = self._ltrb
+        return int(l) + (int(r) - int(l)) / 2
+
+    @property
+    def yCenter(self):
+        _, t, _, b = self._ltrb
+        return int(t) + (int(b) - int(t)) / 2
+
+    @property
+    def width(self):
+        return int(self._ltrb[2] - self._ltrb[0])
+
+    @property
+    def height(self):
+        return int(self._ltrb[3] - self._ltrb[1])
+
+    @property
+    def distance(self):
+        return _optional(self._row['distance'])
+
+    @distance.setter
+    def distance(self, distance):
+        self._boxes.data['distance'][self._index] = np.nan if distance is None else distance
+
+    @property
+    def angle(self):
+        return _optional(self._row['angle'])
+
+    @angle.setter
+    def angle(self, angle):
+        self._boxes.data['angle'][self._index] = np.nan if angle is None else angle
+
+    @property
+    def bearing(self):
+        return _optional(self._row['bearing'])
+
+    @bearing.setter
+    def bearing(self, bearing):
+        self._boxes.data['bearing'][self._index] = np.nan if bearing is None else bearing
@@ -1,11 +1,61 @@
+import os
+import csv
+import time
+import json
+import numpy as np
+
+# 距離的迴歸線校正係數 (斜率, 截距)
+DISTANCE_REGRESSION = (1.2687, 4.5514)
+
 class Measurementor:
-    def __init__(self, focal_length):
+    """Pinhole distance model. Besides the single-box measure(), a
+       calibrated instance (see fit_calibration) carries per-class real
+       widths and the intercept of the regression correction, and
+       measures whole arrays of boxes with measure_classes()."""
+
+    def __init__(self, focal_length, sizes=None, intercept=0., rms=None):
         self._focal_length = focal_length
+        self._sizes = dict(sizes or {})
+        self._intercept = intercept
+        self.rms = rms
         
     def measure(self, acutal_size, rad):
         distance = (self._focal_length * acutal_size) / rad
         return distance
 
+    def measure_classes(self, cls_names, widths):
+        """Distances (cm) for boxes of the given classes and pixel widths;
+           NaN for classes without a calibrated size."""
+        sizes = np.array([self._sizes.get(name, np.nan) for name in cls_names],
+                         dtype=np.float64)
+        widths = np.maximum(np.asarray(widths, dtype=np.float64), 1e-9)
+        return self._focal_length * sizes / widths + self._intercept
+
+    @property
+    def focal_length(self):
+        return self._focal_length
+
+    @property
+    def sizes(self):
+        return dict(self._sizes)
+
+    @property
+    def intercept(self):
+        return self._intercept
+
+    def to_dict(self):
+        return {'focal_length': self._focal_length, 'intercept': self._intercept,
+                'sizes': self._sizes, 'rms': self.rms}
+
+    def save(self, path):
+        with open(path, 'w') as writer:
+            json.dump(self.to_dict(), writer, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as reader:
+            return cls(**json.load(reader))
+
 class Calibrationor:
     def __init__(self, distance):
         self._distance_to_object = distance
@@ -14,9 +64,230 @@ class Calibrationor:
         focallen = (self._distance_to_object * rad) / acutal_size
         return focallen
 
+def read_calibration_captures(directory, labels='labels.csv'):
+    """Read the labelled captures of a calibration directory. `labels`
+       is a CSV with the columns image, class, left, top, right, bottom
+       and distance (cm); rows whose image is missing are skipped.
+       Return (class_names, widths, distances)."""
+    names, widths, distances = [], [], []
+    with open(os.path.join(directory, labels), newline='') as reader:
+        for row in csv.DictReader(reader):
+            image = row.get('image')
+            if image and not os.path.exists(os.path.join(directory, image)):
+                print(f'Skipping {image}: file not found.')
+                continue
+
+            names.append(row['class'])
+            widths.append(float(row['right']) - float(row['left']))
+            distances.append(float(row['distance']))
+
+    return names, np.asarray(widths), np.asarray(distances)
+
+def fit_calibration(cls_names, widths, distances, known_sizes=None):
+    """Fit D = F * S_c / w + b over all captures in one least-squares
+       solve, with one unknown F * S_c per class plus the shared
+       intercept b. Only the products F * S_c are observable, so the
+       focal length F is taken from the classes whose real width (cm)
+       is given in `known_sizes`; without any the sizes are expressed
+       for F = 1. Return a calibrated Measurementor."""
+    widths = np.asarray(widths, dtype=np.float64)
+    distances = np.asarray(distances, dtype=np.float64)
+    classes = sorted(set(cls_names))
+    if len(distances) < len(classes) + 1:
+        raise ValueError('not enough captures for the number of classes.')
+
+    index = {name: i for i, name in enumerate(classes)}
+    column = np.array([index[name] for name in cls_names])
+    A = np.zeros((len(distances), len(classes) + 1))
+    A[np.arange(len(distances)), column] = 1. / widths
+    A[:, -1] = 1.
+
+    solution, *_ = np.linalg.lstsq(A, distances, rcond=None)
+    products, intercept = solution[:-1], solution[-1]
+    rms = float(np.sqrt(np.mean((A @ solution - distances) ** 2)))
+
+    known = {name: size for name, size in (known_sizes or {}).items() if name in index}
+    focal_length = float(np.mean([products[index[name]] / size
+                                  for name, size in known.items()])) if known else 1.
+    sizes = {name: float(products[i] / focal_length) for name, i in index.items()}
+    return Measurementor(focal_length, sizes, float(intercept), rms)
+
+def measure_distances(widths, heights, focal_length, calibration_distance,
+                      regression=DISTANCE_REGRESSION):
+    """Distances (cm) of all boxes at once: the focal-length model on the
+       box width and its enclosing circle, shifted by the calibration
+       distance when closer than it, then the regression correction.
+       Rounded to 2 decimals like the per-box version."""
+    widths = np.asarray(widths, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+
+    size = np.ceil(np.sqrt(widths * widths + heights * heights))
+    # 寬度為 0 的框以 1e-9 代替，得到極大的有限距離 (而非 inf)，不會讓整批計算失敗
+    distance = Measurementor(focal_length).measure(size, np.maximum(widths, 1e-9))
+    distance += calibration_distance * (distance < calibration_distance)
+
+    slope, intercept = regression
+    return np.rint((slope * distance + intercept) * 100) / 100
+
+def bearing_angles(x_centers, y_centers, frame_width, frame_height):
+    """Angles (degrees) between the vector to the bottom center of the
+       frame and the vector to each box center, rounded to 1 decimal."""
+    v1_x, v1_y = frame_width / 2, frame_height
+    x = np.asarray(x_centers, dtype=np.float64)
+    y = np.asarray(y_centers, dtype=np.float64)
+
+    cos_angle = (v1_x * x + v1_y * y) / (np.hypot(v1_x, v1_y) * np.maximum(np.hypot(x, y), 1e-9))
+    angle = np.degrees(np.arccos(np.minimum(cos_angle, 1.)))
+    return np.rint(angle * 10) / 10
+
+class GroundPlane:
+    """Flat-ground camera model. For a camera at a fixed height and pitch
+       the image row v of a point on the ground at distance D follows
+       the 1-D homography v = (a + b * D) / (D + c), where b is the
+       horizon row. The model is either derived from the camera geometry
+       (from_camera) or fitted to calibration captures (fit); a
+       row -> distance and a column -> bearing table are then built once
+       so that measuring a box is an array lookup on its bottom edge."""
+
+    def __init__(self, a, b, c, image_size, horizontal_fov=62.2, rms=None):
+        self.a, self.b, self.c = float(a), float(b), float(c)
+        self.image_size = tuple(int(s) for s in image_size)
+        self.horizontal_fov = float(horizontal_fov)
+        self.rms = rms
+        self._build_lut()
+
+    @classmethod
+    def from_camera(cls, height, pitch, image_size, vertical_fov=48.8, horizontal_fov=62.2):
+        """`height` in cm, `pitch` (downwards) and FOVs in degrees. The
+           defaults are the Raspberry Pi camera v2's field of view."""
+        w, h = image_size
+        f = (h / 2) / np.tan(np.radians(vertical_fov) / 2)
+        t = np.tan(np.radians(pitch))
+        cy = h / 2
+        return cls(height * (cy * t + f), cy - f * t, height * t, image_size, horizontal_fov)
+
+    @classmethod
+    def fit(cls, rows, distances, image_size, horizontal_fov=62.2):
+        """Least-squares fit of the model to calibration samples: the
+           bottom-edge row of an object standing on the ground and its
+           measured distance (cm). At least three distinct distances."""
+        v = np.asarray(rows, dtype=np.float64)
+        d = np.asarray(distances, dtype=np.float64)
+        if v.size < 3 or np.unique(d).size < 3:
+            raise ValueError('at least 3 samples at different distances are needed.')
+
+        # v * (D + c) = a + b * D  ->  [1, D, -v] . [a, b, c] = v * D
+        A = np.stack([np.ones_like(d), d, -v], axis=1)
+        (a, b, c), *_ = np.linalg.lstsq(A, v * d, rcond=None)
+        model = cls(a, b, c, image_size, horizontal_fov)
+        model.rms = float(np.sqrt(np.mean((model.distance(v) - d) ** 2)))
+        return model
+
+    @classmethod
+    def fit_boxes(cls, samples, image_size, horizontal_fov=62.2):
+        """fit() from (ltrb, distance) calibration captures."""
+        return cls.fit([ltrb[3] for ltrb, _ in samples],
+                       [distance for _, distance in samples],
+                       image_size, horizontal_fov)
+
+    def _build_lut(self):
+        w, h = self.image_size
+        v = np.arange(h, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distance = (self.a - self.c * v) / (v - self.b)
+        # 地平線以上的列沒有對應的地面距離
+        distance[(v <= self.b) | ~(distance > 0)] = np.inf
+        self._row_distance = distance
+
+        fx = (w / 2) / np.tan(np.radians(self.horizontal_fov) / 2)
+        u = np.arange(w, dtype=np.float64)
+        self._col_bearing = np.degrees(np.arctan((u - w / 2) / fx))
+
+    def resized(self, image_size):
+        """The same model for frames resized to `image_size`. Rows scale
+           by the height ratio, so a and b (rows) scale with it and c (cm)
+           does not; the bearing table is rebuilt for the new width."""
+        image_size = tuple(int(s) for s in image_size)
+        if image_size == self.image_size: return self
+
+        scale = image_size[1] / self.image_size[1]
+        return GroundPlane(self.a * scale, self.b * scale, self.c, image_size,
+                           self.horizontal_fov, self.rms)
+
+    def distance(self, rows):
+        """Ground distance (cm) for image rows, inf above the horizon."""
+        rows = np.clip(np.asarray(rows, dtype=np.int64), 0, self.image_size[1] - 1)
+        return self._row_distance[rows]
+
+    def bearing(self, cols):
+        """Bearing (degrees, negative to the left) for image columns."""
+        cols = np.clip(np.asarray(cols, dtype=np.int64), 0, self.image_size[0] - 1)
+        return self._col_bearing[cols]
+
+    def to_dict(self):
+        return {'a': self.a, 'b': self.b, 'c': self.c,
+                'image_size': list(self.image_size),
+                'horizontal_fov': self.horizontal_fov, 'rms': self.rms}
+
+    def save(self, path):
+        with open(path, 'w') as writer:
+            json.dump(self.to_dict(), writer, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as reader:
+            return cls(**json.load(reader))
+
+def benchmark_geometry(counts=(1, 10, 50), repeat=2000, frame_size=(960, 720),
+                       focal_length=14.536741214057509, calibration_distance=35):
+    """Compare the per-box Python loop with measure_distances and
+       bearing_angles; return {count: (loop_us, vectorized_us)}."""
+    w, h = frame_size
+    rng = np.random.default_rng(0)
+    results = {}
+
+    for count in counts:
+        l = rng.integers(0, w // 2, count)
+        t = rng.integers(h // 2, h - 100, count)
+        r = l + rng.integers(w // 4, w // 2, count)
+        b = np.minimum(t + rng.integers(h // 4, h // 2, count), h)
+        boxes = list(zip(l.tolist(), t.tolist(), r.tolist(), b.tolist()))
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for bl, bt, br, bb in boxes:
+                bw, bh = br - bl, bb - bt
+                size = int(np.ceil(((bw ** 2) + (bh ** 2)) ** 0.5))
+                distance = Measurementor(focal_length).measure(size, bw)
+                if distance < calibration_distance:
+                    distance = calibration_distance + distance
+                distance = round(1.2687 * distance + 4.5514, 2)
+
+                v1 = np.array([w / 2, h])
+                v2 = np.array([bl + bw / 2, bt + bh / 2])
+                cos_angle = v1.dot(v2) / (np.sqrt(v1.dot(v1)) * np.sqrt(v2.dot(v2)))
+                round(np.arccos(cos_angle) * 360 / 2 / np.pi, 1)
+        loop = (time.perf_counter() - start) / repeat
+
+        ltrb = np.array(boxes, dtype=np.int32)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            bw = ltrb[:, 2] - ltrb[:, 0]
+            bh = ltrb[:, 3] - ltrb[:, 1]
+            measure_distances(bw, bh, focal_length, calibration_distance)
+            bearing_angles(ltrb[:, 0] + bw / 2, ltrb[:, 1] + bh / 2, w, h)
+        vectorized = (time.perf_counter() - start) / repeat
+
+        results[count] = (loop * 1e6, vectorized * 1e6)
+        print(f'{count:>3} boxes: loop {loop * 1e6:8.1f}us, '
+              f'vectorized {vectorized * 1e6:8.1f}us ({loop / vectorized:.1f}x)')
+
+    return results
+
 
 if __name__ == '__main__':
     import math
+    import argparse
     from collections import namedtuple
 
     class BoundingBox:
@@ -104,11 +375,46 @@ if __name__ == '__main__':
         return distance
 
 
-    calibration_distance = 35 #校準時的距離
-    bbox = BoundingBox(('bottle', 0.84, (255, 72, 385, 356))) #35cm
-    focallen = _calibrate(calibration_distance, bbox)  #物距35公分下的相機焦距
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', nargs='?', default='demo',
+                        choices=('demo', 'benchmark', 'ground', 'calibrate'))
+    parser.add_argument('directory', nargs='?',
+                        help='directory of labelled captures (calibrate mode)')
+    parser.add_argument('--known', action='append', default=[], metavar='CLASS=CM',
+                        help='real width of a class, fixes the focal length (calibrate mode)')
+    parser.add_argument('--sample', nargs=2, type=float, action='append',
+                        metavar=('ROW', 'CM'), default=[],
+                        help='bottom-edge row of an object and its distance (ground mode)')
+    parser.add_argument('--image-size', nargs=2, type=int, default=(960, 720))
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.mode == 'benchmark':
+        benchmark_geometry()
+    elif args.mode == 'ground':
+        rows, distances = zip(*args.sample) if args.sample else ((), ())
+        ground = GroundPlane.fit(rows, distances, args.image_size)
+        output = args.output or 'data/ground_plane.json'
+        ground.save(output)
+        print(f'horizon row {ground.b:.1f}, rms error {ground.rms:.2f}cm, saved to {output}')
+    elif args.mode == 'calibrate':
+        known = {name: float(size) for name, size in
+                 (item.split('=', 1) for item in args.known)}
+        measurementor = fit_calibration(
+            *read_calibration_captures(args.directory), known_sizes=known)
+        output = args.output or 'data/calibration.json'
+        measurementor.save(output)
+        print(f'focal length {measurementor.focal_length:.2f}, '
+              f'intercept {measurementor.intercept:.2f}cm, '
+              f'rms error {measurementor.rms:.2f}cm, saved to {output}')
+        for name, size in sorted(measurementor.sizes.items()):
+            print(f'  {name}: {size:.2f}')
+    else:
+        calibration_distance = 35 #校準時的距離
+        bbox = BoundingBox(('bottle', 0.84, (255, 72, 385, 356))) #35cm
+        focallen = _calibrate(calibration_distance, bbox)  #物距35公分下的相機焦距
 
-    focallen = 14.536741214057509 #物距35公分下的相機焦距
-    #bbox = BoundingBox(('cell phone', 0.55, (159, 110, 291, 357))) #30cm時
-    bbox = BoundingBox(('person', 0.65, (87, 49, 555, 344))) #45cm時
-    distance = _measure(calibration_distance, focallen, bbox)
\ No newline at end of file
+        focallen = 14.536741214057509 #物距35公分下的相機焦距
+        #bbox = BoundingBox(('cell phone', 0.55, (159, 110, 291, 357))) #30cm時
+        bbox = BoundingBox(('person', 0.65, (87, 49, 555, 344))) #45cm時
+        distance = _measure(calibration_distance, focallen, bbox)
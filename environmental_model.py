@@ -1,7 +1,9 @@
+import math
 import socketio
 
 import file_controller as fc
 from .image_processor import np_cvt_base64img
+from .box_array import BoxArray
 
 
 class EnvironmentalModel:
@@ -60,22 +62,21 @@ def create_environmental_model(file_path, image, resolution, bboxes):
         'obstacles' : []
     }
 
-    for bbox in bboxes:
-        lt = _to_str(dict(bbox.coordinates.lt._asdict()))
-        rt = _to_str(dict(bbox.coordinates.rt._asdict()))
-        lb = _to_str(dict(bbox.coordinates.lb._asdict()))
-        rb = _to_str(dict(bbox.coordinates.rb._asdict()))
-
+    bboxes = BoxArray.of(bboxes)
+    for cls_name, confidence, (l, t, r, b), distance, angle, bearing in zip(
+            bboxes.class_names, bboxes.confidence.tolist(), bboxes.ltrb.tolist(),
+            bboxes.distance.tolist(), bboxes.angle.tolist(), bboxes.bearing.tolist()):
         model['obstacles'].append({
-            'class': bbox.clsName,
-            'confidence': str(bbox.confidence),
-            'distance': str(bbox.distance),
-            'angle': str(bbox.angle),
+            'class': cls_name,
+            'confidence': str(round(confidence, 2)),
+            'distance': str(None if math.isnan(distance) else distance),
+            'angle': str(None if math.isnan(angle) else angle),
+            'bearing': str(None if math.isnan(bearing) else bearing),
             'coordinate': {
-                'lt': lt,
-                'rt': rt,
-                'lb': lb,
-                'rb': rb,
+                'lt': _to_str({'x': l, 'y': t}),
+                'rt': _to_str({'x': r, 'y': t}),
+                'lb': _to_str({'x': l, 'y': b}),
+                'rb': _to_str({'x': r, 'y': b}),
             }
         })
 
@@ -0,0 +1,174 @@
+import abc
+import os
+import time
+import cv2
+from dataclasses import dataclass, field
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+@dataclass
+class Frame:
+    index: int
+    image: object
+    timestamp: float = field(default_factory = time.monotonic)
+
+
+class IFrameSource:
+    """Produces timestamped BGR frames. Replay sources are paced to the
+       recording's frame rate unless `max_speed` is set, in which case
+       frames are delivered as fast as the consumer reads them. Frames
+       that do not match `resolution` (width, height) are resized to it."""
+
+    def __init__(self, max_speed = False, max_frames = None, resolution = None):
+        self._max_speed = max_speed
+        self._max_frames = max_frames
+        self._resolution = tuple(resolution) if resolution else None
+        self._index = 0
+
+    @abc.abstractmethod
+    def read(self):
+        return NotImplemented
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, trace):
+        self.close()
+
+    def __iter__(self):
+        return self.frames()
+
+    def frames(self):
+        interval = 1 / self.fps if (self.fps and not self._max_speed) else 0
+        next_time = time.monotonic()
+
+        try:
+            while self._max_frames is None or self._index < self._max_frames:
+                if interval:
+                    delay = next_time - time.monotonic()
+                    if delay > 0: time.sleep(delay)
+                    next_time += interval
+
+                image = self.read()
+                if image is None:
+                    break
+                image = self._resize(image)
+
+                yield Frame(index = self._index, image = image)
+                self._index += 1
+        finally:
+            self.close()
+
+    def _resize(self, image):
+        # 錄影檔與圖片資料夾的原始尺寸不一定等於規劃用的影格尺寸
+        if self._resolution is None or image.shape[1::-1] == self._resolution:
+            return image
+        return cv2.resize(image, self._resolution, interpolation = cv2.INTER_AREA)
+
+    @property
+    def fps(self):
+        return None
+
+
+class PiCameraSource(IFrameSource):
+    def __init__(self, resolution, framerate, **kwargs):
+        IFrameSource.__init__(self, resolution = resolution, **kwargs)
+        from picamera.array import PiRGBArray
+        from picamera import PiCamera
+
+        self._camera = PiCamera()
+        self._camera.resolution = resolution
+        self._camera.framerate = framerate
+        self._raw_capture = PiRGBArray(self._camera)
+        self._stream = self._camera.capture_continuous(
+            self._raw_capture, format='bgr', use_video_port=True)
+        time.sleep(0.1)
+
+    def read(self):
+        image = next(self._stream).array
+        self._raw_capture.truncate(0)
+        return image
+
+    def close(self):
+        self._camera.close()
+
+
+class VideoCaptureSource(IFrameSource):
+    """Wraps cv2.VideoCapture. `target` is a device index for live
+       cameras or a path to a recorded video such as
+       yoloTensorflow/data/road.mp4."""
+
+    def __init__(self, target, resolution = None, **kwargs):
+        IFrameSource.__init__(self, resolution = resolution, **kwargs)
+
+        self._capture = cv2.VideoCapture(target)
+        if not self._capture.isOpened():
+            raise IOError(f'Could not open video source {target}.')
+
+        if resolution and not isinstance(target, str):
+            self._capture.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+            self._capture.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+
+        self._is_file = isinstance(target, str)
+
+    def read(self):
+        ret, image = self._capture.read()
+        return image if ret else None
+
+    def close(self):
+        self._capture.release()
+
+    @property
+    def fps(self):
+        # 即時攝影機不需要節流，只有錄影檔才依原始幀率重播
+        if not self._is_file: return None
+        fps = self._capture.get(cv2.CAP_PROP_FPS)
+        return fps if fps > 0 else None
+
+
+class ImageDirectorySource(IFrameSource):
+    def __init__(self, path, fps = None, loop = False, **kwargs):
+        IFrameSource.__init__(self, **kwargs)
+
+        self._files = sorted(
+            os.path.join(path, f) for f in os.listdir(path)
+            if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not self._files:
+            raise IOError(f'No images found in {path}.')
+
+        self._fps = fps
+        self._loop = loop
+        self._cursor = 0
+
+    def read(self):
+        if self._cursor >= len(self._files):
+            if not self._loop: return None
+            self._cursor = 0
+
+        image = cv2.imread(self._files[self._cursor])
+        self._cursor += 1
+        return image
+
+    @property
+    def fps(self):
+        return self._fps
+
+
+def open_frame_source(target = None, resolution = None, framerate = None, **kwargs):
+    """Build a frame source from a loose description: None for the Pi
+       camera, an int (or digit string) for a cv2 capture device, a
+       directory of images, or a video file path."""
+    if target is None:
+        return PiCameraSource(resolution, framerate, **kwargs)
+    if isinstance(target, int) or str(target).isdigit():
+        return VideoCaptureSource(int(target), resolution, **kwargs)
+    if os.path.isdir(target):
+        return ImageDirectorySource(target, fps = framerate, resolution = resolution, **kwargs)
+    if os.path.isfile(target):
+        return VideoCaptureSource(target, resolution, **kwargs)
+
+    raise IOError(f'Unknown frame source {target}.')
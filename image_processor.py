@@ -50,8 +50,9 @@ class NPImage:
         # self.blur()
         # self.canny(lower = 30, upper = 150)
 
-        _, contours, _ = cv2.findContours(self.frame, 
-            cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # OpenCV 3 回傳 (image, contours, hierarchy)，OpenCV 4 回傳 (contours, hierarchy)
+        contours = cv2.findContours(self.frame,
+            cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
 
         return contours
     '''
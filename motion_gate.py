@@ -0,0 +1,68 @@
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap scene-change detector placed in front of detect(). Frames
+       are shrunk to `size` and converted to grayscale, then compared
+       block by block against the frame that was last fully processed;
+       the scene counts as changed when any block's mean absolute
+       difference exceeds `threshold`. To keep the guidance safe a
+       frame is always processed once the previous result is older than
+       `max_stale_frames` frames or `max_stale_seconds` seconds."""
+
+    def __init__(self, size = (80, 60), block = 10, threshold = 6.0,
+                 max_stale_frames = 10, max_stale_seconds = 1.0):
+        if size[0] % block or size[1] % block:
+            raise ValueError('size must be divisible by block.')
+
+        self._size = size
+        self._block = block
+        self._threshold = threshold
+        self._max_stale_frames = max_stale_frames
+        self._max_stale_seconds = max_stale_seconds
+
+        self._reference = None
+        self._stale_frames = 0
+        self._processed_at = None
+        self._skipped = 0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self._size, interpolation = cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def score(self, thumbnail):
+        diff = cv2.absdiff(thumbnail, self._reference).astype(np.float32)
+        w, h = self._size
+        b = self._block
+        blocks = diff.reshape(h // b, b, w // b, b).mean(axis = (1, 3))
+        return float(blocks.max())
+
+    def should_process(self, frame, timestamp = None):
+        """Return True when `frame` must go through detection, False
+           when the previous results can be reused."""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        thumbnail = self._thumbnail(frame)
+
+        stale = (self._reference is None
+                 or self._stale_frames >= self._max_stale_frames
+                 or timestamp - self._processed_at >= self._max_stale_seconds)
+        if stale or self.score(thumbnail) > self._threshold:
+            self._reference = thumbnail
+            self._stale_frames = 0
+            self._processed_at = timestamp
+            return True
+
+        self._stale_frames += 1
+        self._skipped += 1
+        return False
+
+    def reset(self):
+        self._reference = None
+
+    @property
+    def skipped(self):
+        return self._skipped
@@ -0,0 +1,266 @@
+import cv2
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) and (M, 4) arrays of ltrb boxes."""
+    a = np.asarray(boxes_a, dtype = np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype = np.float64).reshape(-1, 4)
+
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.)
+
+def linear_assignment(cost):
+    """Minimum-cost assignment (Hungarian algorithm with potentials).
+       Return an (K, 2) array of (row, column) pairs, K = min(N, M)."""
+    cost = np.asarray(cost, dtype = np.float64)
+    if cost.size == 0:
+        return np.empty((0, 2), dtype = int)
+
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed: cost = cost.T
+    n, m = cost.shape
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype = int)
+    way = np.zeros(m + 1, dtype = int)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype = bool)
+
+        while p[j0] != 0:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(p[1:])
+    pairs = np.stack([p[cols + 1] - 1, cols], axis = 1)
+    if transposed: pairs = pairs[:, ::-1]
+    return pairs[np.argsort(pairs[:, 0])]
+
+
+class KalmanBoxTracker:
+    """Constant-velocity Kalman filter over (cx, cy, area, aspect) as in
+       SORT. The aspect ratio is assumed constant."""
+
+    _F = np.eye(7)
+    _F[0, 4] = _F[1, 5] = _F[2, 6] = 1
+    _H = np.eye(4, 7)
+    _R = np.diag([1., 1., 10., 10.])
+    _Q = np.diag([1., 1., 1., 1., .01, .01, 1e-4])
+
+    def __init__(self, det, track_id):
+        self.id = track_id
+        self.clsName, self.confidence = det[0], det[1]
+
+        self._x = np.zeros(7)
+        self._x[:4] = self._to_z(det[2])
+        self._P = np.diag([10., 10., 10., 10., 1e4, 1e4, 1e4])
+
+        self.hits = 1
+        self.age = 0
+        self.time_since_update = 0
+
+    @staticmethod
+    def _to_z(ltrb):
+        l, t, r, b = ltrb
+        w, h = r - l, b - t
+        return np.array([l + w / 2, t + h / 2, w * h, w / max(h, 1e-6)])
+
+    def predict(self):
+        if self._x[2] + self._x[6] <= 0:
+            self._x[6] = 0
+
+        self._x = self._F @ self._x
+        self._P = self._F @ self._P @ self._F.T + self._Q
+        self.age += 1
+        self.time_since_update += 1
+        return self.ltrb
+
+    def update(self, det):
+        z = self._to_z(det[2])
+        y = z - self._H @ self._x
+        S = self._H @ self._P @ self._H.T + self._R
+        K = self._P @ self._H.T @ np.linalg.inv(S)
+        self._x = self._x + K @ y
+        self._P = (np.eye(7) - K @ self._H) @ self._P
+
+        self.clsName, self.confidence = det[0], det[1]
+        self.hits += 1
+        self.time_since_update = 0
+
+    @property
+    def uncertainty(self):
+        """Standard deviation of the next predicted centre, relative to
+           the box size. Large for tracks whose velocity is still unknown
+           and growing with every frame without an update."""
+        P = self._F @ self._P @ self._F.T + self._Q
+        return np.sqrt(P[0, 0] + P[1, 1]) / max(np.sqrt(max(self._x[2], 0)), 1.)
+
+    @property
+    def ltrb(self):
+        cx, cy, s, r = self._x[:4]
+        w = np.sqrt(max(s * r, 0))
+        h = s / w if w else 0
+        return (cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2)
+
+
+class MultiObjectTracker:
+    """SORT-style tracker. `update` associates fresh detections with the
+       predicted tracks by IoU; `propagate` advances the tracks without
+       detections so boxes can be produced on frames the detector skips.
+       Only tracks matched (or started) by the latest `update` are
+       propagated; unmatched ones are kept up to `max_age` so a later
+       detection can pick them up again, but are not reported. Both
+       return detections in the (clsName, confidence, ltrb, track_id)
+       form accepted by BoundingBox."""
+
+    def __init__(self, max_age = 5, min_hits = 1, iou_threshold = 0.3, decay = 0.9):
+        self._max_age = max_age
+        self._min_hits = min_hits
+        self._iou_threshold = iou_threshold
+        self._decay = decay
+        self._tracks = []
+        self._visible = set()
+        self._next_id = 0
+
+    def update(self, dets):
+        predicted = [track.predict() for track in self._tracks]
+        det_boxes = [det[2] for det in dets]
+
+        matched_tracks = set()
+        matched_dets = set()
+        if predicted and det_boxes:
+            iou = iou_matrix(predicted, det_boxes)
+            for t, d in linear_assignment(-iou):
+                if iou[t, d] >= self._iou_threshold:
+                    self._tracks[t].update(dets[d])
+                    matched_tracks.add(t)
+                    matched_dets.add(d)
+
+        for d, det in enumerate(dets):
+            if d not in matched_dets:
+                self._tracks.append(KalmanBoxTracker(det, self._next_id))
+                self._next_id += 1
+
+        self._prune()
+        # 這次偵測沒有對應到的 track 不再輸出，避免已消失的障礙物在跳過的影格重新出現
+        self._visible = {track.id for track in self._tracks if track.time_since_update == 0}
+        return [self._as_det(track) for track in self._visible_tracks()]
+
+    def propagate(self):
+        for track in self._tracks:
+            track.predict()
+
+        self._prune()
+        return [self._as_det(track) for track in self._visible_tracks()]
+
+    def _visible_tracks(self):
+        return [track for track in self._tracks
+                if track.id in self._visible and track.hits >= self._min_hits]
+
+    def _prune(self):
+        self._tracks = [track for track in self._tracks
+                        if track.time_since_update <= self._max_age]
+
+    def _track_confidence(self, track):
+        return track.confidence * self._decay ** track.time_since_update
+
+    def _as_det(self, track):
+        l, t, r, b = (int(round(c)) for c in track.ltrb)
+        return (track.clsName, round(self._track_confidence(track), 2),
+                (l, t, r, b), track.id)
+
+    def reset(self):
+        self._tracks = []
+        self._visible = set()
+
+    @property
+    def confidence(self):
+        """Lowest decayed confidence among live tracks (1 if none)."""
+        if not self._tracks: return 1.
+        return min(self._track_confidence(track) for track in self._tracks)
+
+    @property
+    def uncertainty(self):
+        """Largest relative position uncertainty among the reported
+           tracks (0 if none)."""
+        return max((track.uncertainty for track in self._visible_tracks()), default = 0.)
+
+    @property
+    def tracks(self):
+        return self._tracks
+
+
+class TrackedDetector:
+    """Runs `detect_fn` only every `interval` frames, or earlier when a
+       reported track's predicted position becomes unreliable (its
+       uncertainty exceeds `max_uncertainty` box sizes, e.g. a new track
+       whose motion is not known yet), and propagates the tracked boxes
+       on the frames in between."""
+
+    def __init__(self, detect_fn, interval = 3, max_uncertainty = 0.25, tracker = None):
+        self._detect = detect_fn
+        self._interval = max(1, interval)
+        self._max_uncertainty = max_uncertainty
+        self._tracker = tracker or MultiObjectTracker()
+        self._since_detect = None
+
+    def __call__(self, frame, draw = True):
+        """Return (result_image, dets, detected)."""
+        due = self._since_detect is None or self._since_detect + 1 >= self._interval
+        if due or self._tracker.uncertainty > self._max_uncertainty:
+            result, dets = self._detect(frame, draw = draw)
+            self._since_detect = 0
+            return result, self._tracker.update(dets), True
+
+        self._since_detect += 1
+        dets = self._tracker.propagate()
+        result = frame
+        if draw:
+            result = frame.copy()
+            draw_tracks(result, dets)
+        return result, dets, False
+
+    @property
+    def tracker(self):
+        return self._tracker
+
+
+def draw_tracks(image, dets, color = (255, 128, 0)):
+    for cls_name, confidence, (l, t, r, b), track_id in dets:
+        cv2.rectangle(image, (l, t), (r, b), color, 2)
+        cv2.putText(image, f'{cls_name}#{track_id}: {confidence:.2f}', (l, t - 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, lineType=cv2.LINE_AA)
+    return image
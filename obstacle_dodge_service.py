@@ -1,8 +1,10 @@
 import time
-import queue
-import math
+import heapq
+import cv2
 import operator
+import numpy as np
 from enum import Enum
+from collections import deque, OrderedDict
 
 
 class MazeSymbol(str, Enum):
@@ -20,15 +22,30 @@ class MazeSymbol(str, Enum):
         return self.value
 
 
+# uint8 迷宮格子的編碼
+GRID_ROAD, GRID_OBSTACLE, GRID_START, GRID_END = 0, 1, 2, 3
+_GRID_SYMBOLS = np.array([MazeSymbol.ROAD, MazeSymbol.OBSTACLE,
+                          MazeSymbol.START, MazeSymbol.END], dtype=object)
+_GRID_CODES = {symbol.value: code for code, symbol in enumerate(_GRID_SYMBOLS)}
+_ENDPOINT_SYMBOLS = (MazeSymbol.START.value, MazeSymbol.END.value)
+
+
 class Maze:
     def __init__(self, data):
+        self._grid = None
         if type(data) is str:
             self.read_file(data)
         elif type(data) is list:
             self._data = data
+        elif isinstance(data, np.ndarray):
+            # uint8 格子 (GRID_* 編碼)，需要串列時才轉換
+            self._grid = data
+            self._data = None
         else:
             raise AttributeError(
-                'data type must be file path(str) or maze(list).')
+                'data type must be file path(str), maze(list) or grid(ndarray).')
+        # 起點與終點在建構時就記下來，find 不必每次掃描整個迷宮
+        self._endpoints = {symbol: self._scan(symbol) for symbol in _ENDPOINT_SYMBOLS}
 
     def __str__(self):
         return '\n'.join(''.join(r) for r in self.data)
@@ -54,127 +71,222 @@ class Maze:
     def find(self, symbol):
         """Find the first instance of the specified symbol in the
            maze, and return the row-index and column-index of the
-           matching cell. Return None if no such cell is found."""
-        for r, line in enumerate(self.data):
+           matching cell. Return None if no such cell is found. The
+           start and end cells are looked up in O(1)."""
+        symbol = str(symbol)
+        if symbol in self._endpoints:
+            return self._endpoints[symbol]
+        return self._scan(symbol)
+
+    def _scan(self, symbol):
+        if self._grid is not None:
+            code = _GRID_CODES.get(symbol)
+            if code is None: return None
+            cells = np.flatnonzero(self._grid == code)
+            if not cells.size: return None
+            return tuple(int(i) for i in divmod(cells[0], self._grid.shape[1]))
+
+        for r, line in enumerate(self._data):
             try:
-                return r, line.index(MazeSymbol.START)
+                return r, line.index(symbol)
             except ValueError:
                 pass
 
     def get(self, where):
         """Return the symbol stored in the specified cell."""
         r, c = where
-        return self._data[r][c]
+        return self.data[r][c]
 
     def set(self, where, symbol):
         """Store the specified symbol in the specified cell."""
         r, c = where
+        self._data = self.data
+        self._grid = None
+        previous = self._data[r][c]
         self._data[r][c] = symbol
+        for endpoint in _ENDPOINT_SYMBOLS:
+            if endpoint in (previous, symbol):
+                self._endpoints[endpoint] = self._scan(endpoint)
+
+    def to_grid(self):
+        """Return the maze as a uint8 occupancy grid (1 = obstacle)."""
+        if self._grid is not None:
+            return (self._grid == GRID_OBSTACLE).astype(np.uint8)
+        return np.array([[symbol == MazeSymbol.OBSTACLE for symbol in row]
+                         for row in self._data], dtype=np.uint8)
 
     @property
     def data(self):
+        if self._data is None:
+            self._data = grid_to_maze(self._grid)
         return self._data
 
+    @property
+    def grid(self):
+        """The uint8 GRID_* grid the maze was built from, or None."""
+        return self._grid
+
+    def pack(self):
+        """Return (shape, start, end, bits): the occupancy grid as
+           np.packbits (one bit per cell) plus the indexed endpoints.
+           Path and backtrack marks are not kept."""
+        grid = self.to_grid()
+        return (grid.shape, self.find(MazeSymbol.START), self.find(MazeSymbol.END),
+                np.packbits(grid, axis=None))
+
+    @classmethod
+    def unpack(cls, shape, start, end, bits):
+        """Rebuild a grid-backed maze from the output of pack()."""
+        rows, cols = shape
+        grid = np.unpackbits(bits, count=rows * cols).reshape(rows, cols)
+        if start is not None: grid[tuple(start)] = GRID_START
+        if end is not None: grid[tuple(end)] = GRID_END
+        return cls(grid)
+
+
+# 二進位迷宮檔：檔頭、每個迷宮一筆索引，接著是各迷宮 packbits 後的位元組
+_MAZE_MAGIC = b'AIDELMZ1'
+_MAZE_HEADER = np.dtype([('magic', 'S8'), ('count', '<u8')])
+_MAZE_RECORD = np.dtype([
+    ('shape', '<u4', (2,)),
+    ('start', '<i4', (2,)),
+    ('end', '<i4', (2,)),
+    ('offset', '<u8')
+])
+
+def save_mazes(path, mazes):
+    """Write `mazes` (Maze objects or GRID_* arrays) to one binary file:
+       a header, a fixed-size record per maze (shape, start, end, byte
+       offset) and the bit-packed occupancy grids, about rows * cols / 8
+       bytes per maze. Read it back with load_mazes."""
+    packed = [(maze if isinstance(maze, Maze) else Maze(maze)).pack() for maze in mazes]
+
+    header = np.zeros(1, dtype=_MAZE_HEADER)
+    header['magic'], header['count'] = _MAZE_MAGIC, len(packed)
+    records = np.zeros(len(packed), dtype=_MAZE_RECORD)
+    offset = 0
+    for record, (shape, start, end, bits) in zip(records, packed):
+        record['shape'] = shape
+        record['start'] = (-1, -1) if start is None else start
+        record['end'] = (-1, -1) if end is None else end
+        record['offset'] = offset
+        offset += bits.size
+
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(records.tobytes())
+        for _, _, _, bits in packed:
+            f.write(bits.tobytes())
+
+def load_mazes(path, mmap=True):
+    """Open a file written by save_mazes. With `mmap` the file is memory
+       mapped and each maze is unpacked only when it is indexed."""
+    return MazeBatch(path, mmap)
+
+
+class MazeBatch:
+    """Read-only sequence of the mazes in a save_mazes file. Indexing
+       returns a grid-backed Maze; grid(i) returns its GRID_* array."""
+
+    def __init__(self, path, mmap=True):
+        buffer = np.memmap(path, dtype=np.uint8, mode='r') if mmap \
+            else np.fromfile(path, dtype=np.uint8)
+        header = buffer[:_MAZE_HEADER.itemsize].view(_MAZE_HEADER)[0]
+        if header['magic'] != _MAZE_MAGIC:
+            raise ValueError(f'{path} is not a maze file.')
+
+        count = int(header['count'])
+        start = _MAZE_HEADER.itemsize
+        stop = start + count * _MAZE_RECORD.itemsize
+        self._records = buffer[start:stop].view(_MAZE_RECORD)
+        self._payload = buffer[stop:]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return Maze(self.grid(index))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def grid(self, index):
+        record = self._records[index]
+        rows, cols = (int(n) for n in record['shape'])
+        offset = int(record['offset'])
+        bits = self._payload[offset:offset + (rows * cols + 7) // 8]
+        grid = np.unpackbits(bits, count=rows * cols).reshape(rows, cols)
+        for code, field in ((GRID_START, 'start'), (GRID_END, 'end')):
+            if record[field][0] >= 0:
+                grid[tuple(int(i) for i in record[field])] = code
+        return grid
+
 
 class PathNotFoundError(Exception):
     pass
 
 
 class BfsDodger:
+    """Breadth-first search from the 'S' cell of the last row to the 'E'
+       cell, on a maze given as a list of rows. Every cell is visited
+       once and remembered with a parent pointer, so the direction string
+       ('L', 'R', 'U', 'D') is rebuilt by walking back from the end."""
+
+    _STEPS = (('L', 0, -1), ('R', 0, 1), ('U', -1, 0), ('D', 1, 0))
+
     def __init__(self, maze):
-        self._seq = queue.Queue()
-        self._seq.put('')
         self._maze = maze
+        self._seq = deque()
         self._directions = ''
 
-    def calculate(self):
-        s = ''
-        while not self._end(s):
-            s = self.seq.get()
-            for direction in ('L', 'R', 'U', 'D'):
-                data = s + direction
-                if self._validate(data):
-                    self.seq.put(data)
-
-    def _end(self, directions):
-        maze = self.maze
-        start = 0
-
-        for i, symbol in enumerate(maze[-1]):
+    def _start(self):
+        for i, symbol in enumerate(self.maze[-1]):
             if symbol == MazeSymbol.START:
-                start = i
-                break
+                return len(self.maze) - 1, i
+        return len(self.maze) - 1, 0
 
-        x = start
-        y = len(maze) - 1
-        for direction in directions:
-            if direction == 'L':
-                x -= 1
-            elif direction == 'R':
-                x += 1
-            elif direction == 'U':
-                y -= 1
-            elif direction == 'D':
-                y += 1
-
-        if maze[y][x] == MazeSymbol.END:
-            print('Found: ' + directions)
-            self._directions = directions
-            return True
-        return False
-
-    def _validate(self, directions):
+    def calculate(self, verbose=True):
         maze = self.maze
-        start = 0
-
-        for i, symbol in enumerate(maze[-1]):
-            if symbol == MazeSymbol.START:
-                start = i
-                break
-
-        x = start
-        y = len(maze) - 1
-        for direction in directions:
-            if direction == 'L':
-                x -= 1
-            elif direction == 'R':
-                x += 1
-            elif direction == 'U':
-                y -= 1
-            elif direction == 'D':
-                y += 1
-
-            if not (0 <= x < len(maze[0]) and 0 <= y < len(maze)):
-                return False
-            elif maze[y][x] == MazeSymbol.OBSTACLE:
-                return False
-
-        return True
+        rows, cols = len(maze), len(maze[0])
+        start = self._start()
+
+        parents = {start: None}
+        self._seq = deque([start])
+        while self._seq:
+            y, x = cell = self._seq.popleft()
+            if maze[y][x] == MazeSymbol.END:
+                self._directions = self._backtrack(parents, cell)
+                if verbose: print('Found: ' + self._directions)
+                return self._directions
+
+            for direction, dy, dx in self._STEPS:
+                ny, nx = y + dy, x + dx
+                if not (0 <= nx < cols and 0 <= ny < rows): continue
+                if (ny, nx) in parents or maze[ny][nx] == MazeSymbol.OBSTACLE: continue
+
+                parents[(ny, nx)] = (cell, direction)
+                self._seq.append((ny, nx))
+
+        raise PathNotFoundError('No solution (no start, end, or path)')
+
+    @staticmethod
+    def _backtrack(parents, cell):
+        directions = []
+        while parents[cell] is not None:
+            cell, direction = parents[cell]
+            directions.append(direction)
+        return ''.join(reversed(directions))
 
     def print_maze(self):
-        maze = self.maze
-        start = 0
-
-        for i, symbol in enumerate(maze[-1]):
-            if symbol == MazeSymbol.START:
-                start = i
-                break
-
-        x = start
-        y = len(maze) - 1
+        y, x = self._start()
         sequence = set()
         for direction in self.directions:
-            if direction == 'L':
-                x -= 1
-            elif direction == 'R':
-                x += 1
-            elif direction == 'U':
-                y -= 1
-            elif direction == 'D':
-                y += 1
+            _, dy, dx = next(step for step in self._STEPS if step[0] == direction)
+            y, x = y + dy, x + dx
             sequence.add((y, x))
 
-        for y, row in enumerate(maze):
+        for y, row in enumerate(self.maze):
             for x, col in enumerate(row):
                 if (y, x) in sequence:
                     print(MazeSymbol.PATH, end='')
@@ -263,74 +375,447 @@ class Dodger:
             raise PathNotFoundError('No solution (no start, end, or path)')
 
 
+class MazeRasterizer:
+    """Rasterizes obstacle boxes into a uint8 maze grid for one frame
+       size and resolution. The empty maze (walls, start and end) is
+       built once; every frame the grid buffer is reset from it with a
+       single copy, and the obstacle spans, computed for all boxes at once,
+       are stamped with slice assignment. The
+       returned grid is reused by the next call, copy it to keep it."""
+
+    def __init__(self, width, height, resolution):
+        if width % resolution != 0 or height % resolution != 0:
+            raise ArithmeticError(
+                'resolution should be divisible by width and height.')
+
+        self.resolution = resolution
+        row_len = int(height / resolution) + 1
+        row_len += 3  # adding default rows (for end, user and wall)
+        col_len = int(width / resolution) + 1
+        col_len += 2  # adding default columns (for road and wall)
+        if col_len % 2 != 0:
+            col_len -= 1
+
+        template = np.full((row_len, col_len), GRID_ROAD, dtype=np.uint8)
+        template[0, :] = GRID_OBSTACLE
+        template[:, col_len - 1] = GRID_OBSTACLE
+        template[row_len - 1, int((col_len - 1) / 2)] = GRID_START
+        template[1, int((col_len - 1) / 2)] = GRID_END
+
+        self._template = template
+        self._grid = template.copy()
+
+    @property
+    def shape(self):
+        return self._template.shape
+
+    def rasterize(self, left, right, bottom, benchmark=0):
+        """Stamp the boxes given by their left, right and bottom edges
+           (pixels); each box blocks one row, from its left to its right
+           edge, like generate_maze always did."""
+        res = self.resolution
+        rows, cols = self._template.shape
+        np.copyto(self._grid, self._template)
+
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        bottom = np.asarray(bottom, dtype=np.int64)
+        if not left.size: return self._grid
+
+        # 與原本逐欄 math.ceil 的結果相同：ceil(l / res) 到 ceil(l / res) + (r - l + res - 1) // res
+        y = -((benchmark - res - bottom) // res)
+        first = -(-left // res)
+        last = np.minimum(first + (right - left + res - 1) // res, cols - 1)
+        first = np.minimum(first, cols - 1)
+        valid = (y >= 0) & (y < rows) & (right >= left)
+
+        grid = self._grid
+        for row, start, stop in zip(y[valid].tolist(), first[valid].tolist(),
+                                    (last[valid] + 1).tolist()):
+            grid[row, start:stop] = GRID_OBSTACLE
+        return grid
+
+
+_rasterizers = {}
+
+def generate_grid(data, width, height, resolution, benchmark=0):
+    """uint8 maze grid (GRID_* codes) for the boxes in `data`, a BoxArray
+       or a list of BoundingBox. The buffer of the shared MazeRasterizer
+       for this size is returned, see MazeRasterizer."""
+    key = (width, height, resolution)
+    if key not in _rasterizers:
+        _rasterizers[key] = MazeRasterizer(width, height, resolution)
+
+    if hasattr(data, 'left'):
+        left, right, bottom = data.left, data.right, data.bottom
+    else:
+        left = [bbox.coordinates.lb.x for bbox in data]
+        right = [bbox.coordinates.rb.x for bbox in data]
+        bottom = [bbox.coordinates.lb.y for bbox in data]
+    return _rasterizers[key].rasterize(left, right, bottom, benchmark)
+
+def grid_to_maze(grid):
+    """List-of-lists MazeSymbol form of a uint8 maze grid."""
+    return _GRID_SYMBOLS[grid].tolist()
+
 def generate_maze(data, width, height, resolution, benchmark=0):
-    if width % resolution != 0 or height % resolution != 0:
-        raise ArithmeticError(
-            'resolution should be divisible by width and height.')
+    """List form of generate_grid, for code that still works on lists."""
+    return grid_to_maze(generate_grid(data, width, height, resolution, benchmark))
+
+
+# 與 Dodger 相同的方向順序與標記：上、右、左、下
+_MOVES = ((-1, 0), (0, 1), (0, -1), (1, 0))
+_MOVE_MARKS = ('^', '>', '<', 'v')
+
+def _neighbours(grid):
+    """Flat-index offsets of the four moves and, per move, a mask of the
+       cells from which the move stays inside the grid."""
+    rows, cols = grid.shape
+    r, c = np.divmod(np.arange(grid.size), cols)
+    inside = (r > 0, c < cols - 1, c > 0, r < rows - 1)
+    offsets = tuple(dr * cols + dc for dr, dc in _MOVES)
+    return offsets, tuple(mask.tolist() for mask in inside)
+
+def _reconstruct(parent, start, end):
+    path = [end]
+    while path[-1] != start:
+        path.append(int(parent[path[-1]]))
+    return path[::-1]
+
+def grid_bfs(grid, start, end):
+    """Shortest 4-connected path on a uint8 grid (non-zero = blocked)
+       from `start` to `end` (row, col). Return the list of flat cell
+       indices, or None when `end` cannot be reached."""
+    rows, cols = grid.shape
+    blocked = grid.ravel().tolist()
+    offsets, inside = _neighbours(grid)
+    source, target = start[0] * cols + start[1], end[0] * cols + end[1]
+
+    parent = np.full(grid.size, -1, dtype=np.int64)
+    parent[source] = source
+    frontier = deque([source])
+    while frontier:
+        cell = frontier.popleft()
+        if cell == target:
+            return _reconstruct(parent, source, target)
+
+        for offset, mask in zip(offsets, inside):
+            nxt = cell + offset
+            if mask[cell] and not blocked[nxt] and parent[nxt] < 0:
+                parent[nxt] = cell
+                frontier.append(nxt)
+    return None
+
+def clearance_cost(grid, weight=2., safe_distance=3.):
+    """Per-cell step cost from obstacle clearance. The Euclidean distance
+       (in cells) of every free cell to the nearest obstacle is computed
+       once with cv2.distanceTransform; cells closer than
+       `safe_distance` cost up to 1 + `weight`, the rest cost 1."""
+    clearance = cv2.distanceTransform(
+        (grid == 0).astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    penalty = np.clip(safe_distance - clearance, 0., None) / safe_distance
+    return 1. + weight * penalty
+
+def grid_astar(grid, start, end, cost_map=None):
+    """A* with the Manhattan heuristic on a uint8 grid, same contract as
+       grid_bfs. Ties are broken towards the goal and then in the move
+       order up, right, left, down. With a `cost_map` (per-cell step
+       costs >= 1, see clearance_cost) the cheapest path is returned
+       instead of the shortest one."""
+    rows, cols = grid.shape
+    blocked = grid.ravel().tolist()
+    step = cost_map.ravel().tolist() if cost_map is not None else None
+    offsets, inside = _neighbours(grid)
+    source, target = start[0] * cols + start[1], end[0] * cols + end[1]
+    end_r, end_c = end
+
+    parent = np.full(grid.size, -1, dtype=np.int64)
+    cost = [None] * grid.size
+    parent[source] = source
+    cost[source] = 0
+
+    counter = 0
+    heap = [(abs(start[0] - end_r) + abs(start[1] - end_c), 0, counter, source)]
+    while heap:
+        *_, cell = heapq.heappop(heap)
+        if cell == target:
+            return _reconstruct(parent, source, target)
+
+        for offset, mask in zip(offsets, inside):
+            nxt = cell + offset
+            if not mask[cell] or blocked[nxt]: continue
+            g = cost[cell] + (step[nxt] if step else 1)
+            if cost[nxt] is not None and cost[nxt] <= g: continue
+
+            cost[nxt] = g
+            parent[nxt] = cell
+            r, c = divmod(nxt, cols)
+            h = abs(r - end_r) + abs(c - end_c)
+            counter += 1
+            heapq.heappush(heap, (g + h, h, counter, nxt))
+    return None
+
+def path_to_directions(path, cols):
+    """Turn a list of flat cell indices into Dodger's direction marks."""
+    marks = {dr * cols + dc: mark for (dr, dc), mark in zip(_MOVES, _MOVE_MARKS)}
+    return [marks[b - a] for a, b in zip(path, path[1:])]
+
+
+class GridDodger:
+    """Iterative replacement for Dodger. The maze is converted to a uint8
+       occupancy grid and searched with A* (or BFS), so the path is the
+       shortest one, the maze is left untouched and there is no
+       recursion limit. solve() returns the same direction marks as
+       Dodger.solve(). With a `clearance` weight A* plans on the
+       clearance_cost map, keeping the path away from obstacles."""
+
+    def __init__(self, algorithm='astar', clearance=0., safe_distance=3.):
+        if algorithm not in ('astar', 'bfs'):
+            raise ValueError(f'unknown algorithm {algorithm}.')
+        if clearance and algorithm != 'astar':
+            raise ValueError('clearance costs need the astar algorithm.')
+        self._search = grid_astar if algorithm == 'astar' else grid_bfs
+        self._clearance = clearance
+        self._safe_distance = safe_distance
 
-    # sorting the data by distance (Ascending)
-    data.sort(key=lambda bbox: bbox.distance)
+    def solve(self, maze):
+        start = maze.find(MazeSymbol.START)
+        end = maze.find(MazeSymbol.END)
+        if start is None or end is None:
+            raise PathNotFoundError('No solution (no start, end, or path)')
 
-    maze = []
-    row_len = int(height / resolution) + 1
-    row_len += 1  # adding default row (for end)
-    row_len += 1  # adding default row (for user)
-    row_len += 1  # adding default row (for wall)
-    col_len = int(width / resolution) + 1
-    col_len += 1  # adding default column (for road)
-    col_len += 1  # adding default column (for wall)
-
-    if col_len % 2 != 0:
-        col_len -= 1
-
-    # generating empty maze and wall
-    for i in range(row_len):
-        maze.append([])
-        for j in range(col_len):
-            if i == 0 or j == col_len - 1:
-                maze[i].append(MazeSymbol.OBSTACLE)
+        grid = maze.to_grid()
+        if self._clearance:
+            cost_map = clearance_cost(grid, self._clearance, self._safe_distance)
+            path = grid_astar(grid, start, end, cost_map)
+        else:
+            path = self._search(grid, start, end)
+        if path is None:
+            raise PathNotFoundError('No solution (no start, end, or path)')
+        return path_to_directions(path, grid.shape[1])
+
+
+class DStarLite:
+    """D* Lite (Koenig & Likhachev) on a 4-connected uint8 occupancy grid
+       (non-zero = blocked) with unit step costs. The search runs
+       backwards from the goal, so g/rhs values and the priority queue
+       stay valid across frames: update() takes the next grid, applies
+       only the cells that changed and plan() repairs the previous
+       solution instead of searching from scratch."""
+
+    def __init__(self, grid, start, goal):
+        self._rows, self._cols = grid.shape
+        offsets, inside = _neighbours(grid)
+        self._adjacent = [[u + offset for offset, mask in zip(offsets, inside) if mask[u]]
+                          for u in range(grid.size)]
+        self._blocked = grid.ravel().astype(bool)
+        self._blocked_list = self._blocked.tolist()
+
+        self._start = start[0] * self._cols + start[1]
+        self._goal = goal[0] * self._cols + goal[1]
+        self._last = self._start
+        self._km = 0
+        self._h_start = self._heuristics(self._start)
+
+        inf = float('inf')
+        self._g = [inf] * grid.size
+        self._rhs = [inf] * grid.size
+        self._rhs[self._goal] = 0
+        self._queued = {}  # 節點 -> 目前在佇列中的 key，其餘為過期項目
+        self._heap = []
+        self._push(self._goal, self._key(self._goal))
+
+        self.expanded = 0
+
+    @property
+    def shape(self):
+        return self._rows, self._cols
+
+    def _h(self, a, b):
+        ar, ac = divmod(a, self._cols)
+        br, bc = divmod(b, self._cols)
+        return abs(ar - br) + abs(ac - bc)
+
+    def _heuristics(self, start):
+        r, c = np.divmod(np.arange(self._rows * self._cols), self._cols)
+        sr, sc = divmod(start, self._cols)
+        return (np.abs(r - sr) + np.abs(c - sc)).tolist()
+
+    def _key(self, u):
+        m = min(self._g[u], self._rhs[u])
+        return (m + self._h_start[u] + self._km, m)
+
+    def _push(self, u, key):
+        self._queued[u] = key
+        heapq.heappush(self._heap, (key, u))
+
+    def _update_vertex(self, u):
+        if u != self._goal:
+            best = float('inf')
+            if not self._blocked_list[u]:
+                g = self._g
+                blocked = self._blocked_list
+                for v in self._adjacent[u]:
+                    if not blocked[v] and g[v] + 1 < best:
+                        best = g[v] + 1
+            self._rhs[u] = best
+
+        self._queued.pop(u, None)
+        if self._g[u] != self._rhs[u]:
+            self._push(u, self._key(u))
+
+    def _top_key(self):
+        heap = self._heap
+        while heap and self._queued.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else (float('inf'), float('inf'))
+
+    def _compute_shortest_path(self):
+        start = self._start
+        g, rhs = self._g, self._rhs
+        while (self._top_key() < self._key(start) or rhs[start] != g[start]):
+            if not self._heap: break
+            k_old, u = heapq.heappop(self._heap)
+            del self._queued[u]
+            self.expanded += 1
+
+            k_new = self._key(u)
+            if k_old < k_new:
+                self._push(u, k_new)
+            elif g[u] > rhs[u]:
+                g[u] = rhs[u]
+                for v in self._adjacent[u]:
+                    self._update_vertex(v)
             else:
-                maze[i].append(MazeSymbol.ROAD)
-
-    # setting start
-    maze[row_len - 1][int((col_len - 1) / 2)] = MazeSymbol.START
-
-    # setting end
-    maze[1][int((col_len - 1) / 2)] = MazeSymbol.END
-
-    # setting obstacles
-    for bbox in data:
-        
-        lb = bbox.coordinates.lb
-        rb = bbox.coordinates.rb
-        
-        y = math.ceil((lb.y - benchmark + resolution) / resolution)
-        for x in range(lb.x, rb.x + resolution, resolution):
-            x = math.ceil(x / resolution)
-            if x >= col_len:
-                x -= 1
-
-            maze[y][x] = MazeSymbol.OBSTACLE
-        '''
-        right_side = bbox.xCenter > width / 2
-        radius = bbox.angle * math.pi / 180
-        tangent = math.tan(radius)
-        
-        y = (row_len - 2) - (bbox.distance // resolution)
-        if y < 2: y = 2
-        
-        x = tangent if right_side else -tangent
-        x *= bbox.distance
-        x += width / 2
-        # x = -(resolution / 1.5 + (-x if right_side else x))
-        # if right_side: x = width - x
-        # if x < 0: x += width
-        x //= resolution
-
-        maze[y][x] = MazeSymbol.OBSTACLE
-        '''
-
-    return maze
+                g[u] = float('inf')
+                self._update_vertex(u)
+                for v in self._adjacent[u]:
+                    self._update_vertex(v)
+
+    def move_start(self, start):
+        """Move the robot (the search start) to `start` (row, col)."""
+        start = start[0] * self._cols + start[1]
+        if start != self._start:
+            self._km += self._h(self._last, start)
+            self._last = self._start = start
+            self._h_start = self._heuristics(start)
+
+    def update(self, grid):
+        """Apply a new occupancy grid of the same shape; only the cells
+           whose state changed are touched. Return how many changed."""
+        blocked = grid.ravel().astype(bool)
+        changed = np.flatnonzero(blocked != self._blocked)
+        if not changed.size: return 0
+
+        self._blocked = blocked
+        self._blocked_list = blocked.tolist()
+        # 狀態改變的格子及其鄰居的 rhs 都可能改變，每個只更新一次
+        affected = set(changed.tolist())
+        for u in changed.tolist():
+            affected.update(self._adjacent[u])
+        for u in affected:
+            self._update_vertex(u)
+        return int(changed.size)
+
+    def plan(self):
+        """Shortest path from the start to the goal as flat cell indices,
+           or None. Ties follow the move order up, right, left, down."""
+        self._compute_shortest_path()
+        g = self._g
+        if g[self._start] == float('inf'): return None
+
+        path = [self._start]
+        blocked = self._blocked_list
+        while path[-1] != self._goal:
+            u = path[-1]
+            best = None
+            for v in self._adjacent[u]:
+                if not blocked[v] and (best is None or g[v] < g[best]):
+                    best = v
+            if best is None or g[best] >= g[u]: return None
+            path.append(best)
+        return path
+
+
+class IncrementalDodger:
+    """Drop-in replacement for GridDodger that keeps a DStarLite planner
+       between frames. While the maze keeps its shape, start and end,
+       each solve() only feeds the changed cells to the planner;
+       otherwise a new planner is built."""
+
+    def __init__(self):
+        self._planner = None
+        self._endpoints = None
+
+    def solve(self, maze):
+        start = maze.find(MazeSymbol.START)
+        end = maze.find(MazeSymbol.END)
+        if start is None or end is None:
+            raise PathNotFoundError('No solution (no start, end, or path)')
+
+        grid = maze.to_grid()
+        endpoints = (grid.shape, start, end)
+        if self._planner is None or self._endpoints != endpoints:
+            self._planner = DStarLite(grid, start, end)
+            self._endpoints = endpoints
+        else:
+            self._planner.update(grid)
+
+        path = self._planner.plan()
+        if path is None:
+            raise PathNotFoundError('No solution (no start, end, or path)')
+        return path_to_directions(path, grid.shape[1])
+
+    def reset(self):
+        self._planner = None
+
+
+class PlanCache:
+    """LRU cache in front of a dodger. The key is the grid shape, start,
+       end and the np.packbits of the occupancy grid (one bit per cell),
+       so identical scenes are recognised without keeping whole mazes;
+       at most `maxsize` plans are kept. Unsolvable mazes are cached
+       too and raise PathNotFoundError again on a hit."""
+
+    def __init__(self, dodger, maxsize=128):
+        self._dodger = dodger
+        self._maxsize = maxsize
+        self._plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, maze):
+        shape, start, end, bits = maze.pack()
+        return shape, start, end, bits.tobytes()
+
+    def solve(self, maze):
+        key = self._key(maze)
+        if key in self._plans:
+            self.hits += 1
+            self._plans.move_to_end(key)
+            plan = self._plans[key]
+        else:
+            self.misses += 1
+            try:
+                plan = self._dodger.solve(maze)
+            except PathNotFoundError:
+                plan = None
+
+            self._plans[key] = plan
+            if len(self._plans) > self._maxsize:
+                self._plans.popitem(last=False)
+
+        if plan is None:
+            raise PathNotFoundError('No solution (no start, end, or path)')
+        return list(plan)
+
+    def clear(self):
+        self._plans.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._plans),
+                'hit_rate': self.hits / total if total else 0.}
 
 
 if __name__ == '__main__':
@@ -342,16 +827,15 @@ if __name__ == '__main__':
     maze.append([' ', ' ', ' ', '#', ' ', ' ', '#', ' ', '#'])
     maze.append(['#', ' ', '#', ' ', 'S', '#', '#', ' ', '#'])
 
-    '''
     dodger = BfsDodger(maze)
     start = time.time()
     dodger.calculate()
     dodger.print_maze()
     end = time.time()
     print('花費時間: {}s'.format(round(end - start, 2)))
-    '''
 
     maze = Maze(maze)
+    print(GridDodger().solve(maze))
     dodger = Dodger()
     dirs = dodger.solve(maze)
     print(maze)
@@ -0,0 +1,221 @@
+import time
+from threading import Thread, Condition, Event
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+
+import utils
+
+
+class DropPolicy(Enum):
+    DROP_OLDEST = 'drop_oldest'  # latest wins: evict the queued item
+    DROP_NEWEST = 'drop_newest'  # keep what is queued, discard the new item
+    BLOCK = 'block'              # back-pressure the producer
+
+
+class PipelineClosedError(Exception):
+    pass
+
+
+class StageQueue:
+    """Bounded hand-off queue between two pipeline stages. When the
+       queue is full the configured drop policy decides whether the
+       oldest item is evicted, the new item is discarded, or the
+       producer blocks until there is room."""
+
+    def __init__(self, maxsize = 1, policy = DropPolicy.DROP_OLDEST):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1.')
+
+        self._items = deque()
+        self._maxsize = maxsize
+        self._policy = policy
+        self._cond = Condition()
+        self._closed = False
+        self._dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._closed:
+                raise PipelineClosedError('queue is closed.')
+
+            if len(self._items) >= self._maxsize:
+                if self._policy == DropPolicy.DROP_OLDEST:
+                    self._items.popleft()
+                    self._dropped += 1
+                elif self._policy == DropPolicy.DROP_NEWEST:
+                    self._dropped += 1
+                    return False
+                else:
+                    while len(self._items) >= self._maxsize and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        raise PipelineClosedError('queue is closed.')
+
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout = None):
+        with self._cond:
+            if not self._cond.wait_for(
+                    lambda: self._items or self._closed, timeout):
+                return None
+            if not self._items:
+                raise PipelineClosedError('queue is closed.')
+
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+@dataclass
+class FramePacket:
+    index: int
+    frame: object
+    timestamp: float = field(default_factory = time.monotonic)
+    draw: bool = True
+    reused: bool = False
+    result: object = None
+    dets: list = field(default_factory = list)
+    bboxes: list = field(default_factory = list)
+    maze: object = None
+    dirs: list = None
+    cue: tuple = None
+    marks: dict = field(default_factory = dict)
+
+
+class Stage(Thread):
+    """Worker thread that takes items from `inbox`, applies `handler`
+       and forwards any non-None result to `outbox`. A stage without an
+       inbox is a source: `handler` is called with no arguments and
+       must return an iterable of items."""
+
+    def __init__(self, name, handler, inbox = None, outbox = None):
+        Thread.__init__(self, name = name)
+        self.setDaemon(True)
+
+        self._handler = handler
+        self.inbox = inbox
+        self.outbox = outbox
+        self._stop_event = Event()
+        self._processed = 0
+        self._errors = 0
+
+    def run(self):
+        try:
+            if self.inbox is None:
+                self._run_source()
+            else:
+                self._run_worker()
+        except PipelineClosedError:
+            pass
+        finally:
+            if self.outbox is not None:
+                self.outbox.close()
+
+    def _run_source(self):
+        for item in self._handler():
+            if self._stop_event.is_set():
+                break
+            self._emit(item)
+
+    def _run_worker(self):
+        while not self._stop_event.is_set():
+            item = self.inbox.get(timeout = 0.5)
+            if item is None:
+                continue
+
+            try:
+                result = self._handler(item)
+            except Exception:
+                self._errors += 1
+                utils.GLOBAL_LOGGER.exception(f'{self.name} stage failed.')
+                continue
+
+            self._emit(result)
+
+    def _emit(self, item):
+        self._processed += 1
+        if item is not None and self.outbox is not None:
+            self.outbox.put(item)
+
+    def stop(self):
+        self._stop_event.set()
+        if self.inbox is not None:
+            self.inbox.close()
+
+    @property
+    def processed(self):
+        return self._processed
+
+    @property
+    def errors(self):
+        return self._errors
+
+
+class Pipeline:
+    """Chains stages with bounded queues. `stages` is a sequence of
+       (name, handler) pairs where the first handler is a frame source
+       generator; `queues` optionally overrides the queue placed after
+       each stage (defaults to a latest-wins queue of size 1)."""
+
+    def __init__(self, stages, queues = None):
+        if len(stages) < 2:
+            raise ValueError('pipeline needs a source and at least one stage.')
+
+        queues = list(queues or [])
+        queues += [StageQueue() for _ in range(len(stages) - 1 - len(queues))]
+        self._queues = queues
+
+        self._stages = []
+        inbox = None
+        for i, (name, handler) in enumerate(stages):
+            outbox = queues[i] if i < len(queues) else None
+            self._stages.append(Stage(name, handler, inbox, outbox))
+            inbox = outbox
+
+    def start(self):
+        for stage in self._stages:
+            stage.start()
+            utils.GLOBAL_LOGGER.info(f'{stage.name} stage is started.')
+
+    def stop(self):
+        for stage in self._stages:
+            stage.stop()
+        for queue in self._queues:
+            queue.close()
+
+    def join(self, timeout = None):
+        for stage in self._stages:
+            stage.join(timeout)
+
+    def is_alive(self):
+        return any(stage.is_alive() for stage in self._stages)
+
+    def stats(self):
+        stats = {}
+        for i, stage in enumerate(self._stages):
+            stats[stage.name] = {
+                'processed': stage.processed,
+                'errors': stage.errors,
+                'dropped': self._queues[i - 1].dropped if i > 0 else 0
+            }
+        return stats
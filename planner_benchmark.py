@@ -0,0 +1,363 @@
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import multiprocessing as mp
+import numpy as np
+
+from obstacle_dodge_service import Maze, PathNotFoundError, grid_to_maze, grid_bfs, load_mazes
+from obstacle_dodge_service import Dodger, BfsDodger, GridDodger, IncrementalDodger
+from obstacle_dodge_service import GRID_ROAD, GRID_OBSTACLE, GRID_START, GRID_END
+
+
+# BfsDodger 的方向字元轉成其他 dodger 使用的標記
+_BFS_MARKS = {'L': '<', 'R': '>', 'U': '^', 'D': 'v'}
+_MARK_MOVES = {'^': (-1, 0), '>': (0, 1), '<': (0, -1), 'v': (1, 0)}
+
+def _dodger(make):
+    def factory():
+        dodger = make()
+        return lambda grid: dodger.solve(Maze(grid))
+    return factory
+
+# 每個 planner 是一個 factory：產生一個 grid -> 方向標記 的解題函式，
+# 同一個序列共用同一個解題函式，IncrementalDodger 才能沿用上一幀的結果
+PLANNERS = {
+    'Dodger': lambda: lambda grid: Dodger().solve(Maze(grid_to_maze(grid))),
+    'BfsDodger': lambda: lambda grid: [
+        _BFS_MARKS[d] for d in BfsDodger(grid_to_maze(grid)).calculate(verbose=False)],
+    'GridDodger(astar)': _dodger(lambda: GridDodger('astar')),
+    'GridDodger(bfs)': _dodger(lambda: GridDodger('bfs')),
+    'GridDodger(clearance)': _dodger(lambda: GridDodger(clearance=2.)),
+    'IncrementalDodger': _dodger(IncrementalDodger),
+}
+REPLANNERS = ('GridDodger(astar)', 'GridDodger(bfs)', 'IncrementalDodger')
+
+
+def _walled(rows, cols):
+    grid = np.full((rows, cols), GRID_ROAD, dtype=np.uint8)
+    grid[[0, -1], :] = GRID_OBSTACLE
+    grid[:, [0, -1]] = GRID_OBSTACLE
+    return grid
+
+def random_maze(size, density=0.2, seed=0):
+    """Walled size x size grid with uniformly random obstacles. The start
+       is in the middle of the bottom row and the end right under the
+       top wall, as in generate_maze."""
+    rng = np.random.default_rng(seed)
+    grid = _walled(size, size)
+    inner = grid[1:-1, 1:-1]
+    inner[rng.random(inner.shape) < density] = GRID_OBSTACLE
+    grid[-1, size // 2] = GRID_START
+    grid[1, size // 2] = GRID_END
+    return grid
+
+def spiral_maze(size, density=0., seed=0):
+    """Concentric square walls with one gap each, alternating sides, and
+       the end in the centre: the path has to wind all the way around,
+       the worst case for a goal-directed heuristic. `density` fills that
+       fraction of the free cells off the route, so it stays solvable."""
+    rng = np.random.default_rng(seed)
+    grid = _walled(size, size)
+    center = size // 2
+    for ring, offset in enumerate(range(2, center - 1, 2)):
+        lo, hi = offset, size - 1 - offset
+        grid[lo, lo:hi + 1] = grid[hi, lo:hi + 1] = GRID_OBSTACLE
+        grid[lo:hi + 1, lo] = grid[lo:hi + 1, hi] = GRID_OBSTACLE
+        if ring % 2:
+            grid[lo, center] = GRID_ROAD
+        else:
+            grid[hi, center] = GRID_ROAD
+
+    grid[-1, center] = GRID_START
+    grid[-2, center] = GRID_ROAD
+    grid[center, center] = GRID_END
+
+    # 通道只有一格寬，隨機障礙物避開原本的路線以免迷宮無解
+    route = grid_bfs((grid == GRID_OBSTACLE).astype(np.uint8), (size - 1, center), (center, center))
+    free = grid == GRID_ROAD
+    free.flat[route] = False
+    free &= rng.random(grid.shape) < density
+    grid[free] = GRID_OBSTACLE
+    return grid
+
+def dead_end_maze(size, density=0., seed=0):
+    """Perfect maze carved by an iterative randomized depth-first search:
+       one route between any two cells and a dead end at every other
+       turn. `density` reopens that fraction of the inner walls (loops)."""
+    size += 1 - size % 2
+    rng = np.random.default_rng(seed)
+    grid = np.full((size, size), GRID_OBSTACLE, dtype=np.uint8)
+
+    start = (size - 2, 1)
+    grid[start] = GRID_ROAD
+    stack = [start]
+    while stack:
+        r, c = stack[-1]
+        options = [(r + dr, c + dc, dr, dc) for dr, dc in ((-2, 0), (2, 0), (0, -2), (0, 2))
+                   if 0 < r + dr < size - 1 and 0 < c + dc < size - 1
+                   and grid[r + dr, c + dc] == GRID_OBSTACLE]
+        if not options:
+            stack.pop()
+            continue
+        nr, nc, dr, dc = options[rng.integers(len(options))]
+        grid[r + dr // 2, c + dc // 2] = GRID_ROAD
+        grid[nr, nc] = GRID_ROAD
+        stack.append((nr, nc))
+
+    walls = np.argwhere(grid[1:-1, 1:-1] == GRID_OBSTACLE) + 1
+    reopen = walls[rng.random(len(walls)) < density]
+    grid[tuple(reopen.T)] = GRID_ROAD
+
+    center = size // 2 - (size // 2 + 1) % 2  # 奇數欄才在通道上
+    grid[-1, center] = GRID_START
+    grid[-2, center] = GRID_ROAD
+    grid[1, center] = GRID_END
+    return grid
+
+GENERATORS = {'random': random_maze, 'spiral': spiral_maze, 'dead_end': dead_end_maze}
+
+def drifting_sequence(grid, frames=100, move=0.3, seed=0):
+    """Recording-like sequence built from a generated maze: on every
+       frame each inner obstacle cell steps to a random free neighbour
+       with probability `move`. Return an array (frames, rows, cols)."""
+    rng = np.random.default_rng(seed)
+    rows, cols = grid.shape
+    grid = grid.copy()
+    grids = [grid.copy()]
+    for _ in range(frames - 1):
+        cells = np.argwhere(grid[1:-1, 1:-1] == GRID_OBSTACLE) + 1
+        moving = cells[rng.random(len(cells)) < move]
+        steps = np.array(list(_MARK_MOVES.values()))[rng.integers(4, size=len(moving))]
+        for (r, c), (dr, dc) in zip(moving.tolist(), steps.tolist()):
+            nr, nc = r + dr, c + dc
+            if 0 < nr < rows - 1 and 0 < nc < cols - 1 and grid[nr, nc] == GRID_ROAD:
+                grid[r, c], grid[nr, nc] = GRID_ROAD, GRID_OBSTACLE
+        grids.append(grid.copy())
+    return np.stack(grids)
+
+def load_sequence(path):
+    """A recorded sequence: a .npy array of GRID_* grids or a file
+       written by save_mazes."""
+    if path.endswith('.npy'):
+        return np.load(path)
+    batch = load_mazes(path)
+    return np.stack([batch.grid(i) for i in range(len(batch))])
+
+
+def check_path(grid, directions):
+    """Replay direction marks from the start; return True when they stay
+       on free cells inside the grid and finish on the end."""
+    rows, cols = grid.shape
+    r, c = (int(i) for i in np.argwhere(grid == GRID_START)[0])
+    for mark in directions:
+        dr, dc = _MARK_MOVES[mark]
+        r, c = r + dr, c + dc
+        if not (0 <= r < rows and 0 <= c < cols) or grid[r, c] == GRID_OBSTACLE:
+            return False
+    return bool(grid[r, c] == GRID_END)
+
+def _solve(solve, grid):
+    try:
+        return 'ok', solve(grid)
+    except (PathNotFoundError, IndexError):
+        # Dodger 在無解時可能走出格子而得到 IndexError
+        return 'no_path', None
+    except RecursionError:
+        return 'recursion_limit', None
+
+def _solve_all(name, grids):
+    solve = PLANNERS[name]()
+    return [_solve(solve, grid) for grid in grids]
+
+def _run(name, grids, conn):
+    sys.stdout = open(os.devnull, 'w')  # 舊的 dodger 會印出路徑
+    # tracemalloc 會讓各 planner 變慢的程度不一，時間與記憶體分兩次量
+    start = time.perf_counter()
+    outcomes = _solve_all(name, grids)
+    conn.send((time.perf_counter() - start, outcomes))
+
+    tracemalloc.start()
+    _solve_all(name, grids)
+    conn.send(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    conn.close()
+
+def _receive(receiver, timeout):
+    if not receiver.poll(timeout): return None
+    try:
+        return receiver.recv()
+    except EOFError:
+        return EOFError
+
+def run_sequence(name, grids, timeout=5.):
+    """Solve the `grids` in order with one planner instance, in a child
+       process so a planner that exceeds `timeout` seconds can be
+       killed. The timed run is followed by a second one under
+       tracemalloc for the peak memory, with its own `timeout`; the peak
+       is None if that run does not finish. Return (status, seconds,
+       peak_bytes, outcomes) with one (status, directions) per grid."""
+    context = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else None)
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run, args=(name, grids, sender), daemon=True)
+    process.start()
+    sender.close()
+
+    status, seconds, peak, outcomes = 'ok', None, None, None
+    result = _receive(receiver, timeout)
+    if result is None:
+        status, seconds = 'timeout', timeout
+    elif result is EOFError:
+        # 子行程異常結束 (例如遞迴過深造成的堆疊溢位)
+        status = 'crashed'
+    else:
+        seconds, outcomes = result
+        peak = _receive(receiver, timeout)
+        if peak is EOFError: peak = None
+
+    process.join(0.1)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+    return status, seconds, peak, outcomes
+
+def run_planner(name, grid, timeout=5.):
+    """run_sequence for a single grid. Return (status, seconds,
+       peak_bytes, directions)."""
+    status, seconds, peak, outcomes = run_sequence(name, [grid], timeout)
+    if outcomes is None:
+        return status, seconds, peak, None
+    status, directions = outcomes[0]
+    return status, seconds, peak, directions
+
+def _reference(grid):
+    """Shortest path length from a grid_bfs reference, None if unsolvable."""
+    start = tuple(int(i) for i in np.argwhere(grid == GRID_START)[0])
+    end = tuple(int(i) for i in np.argwhere(grid == GRID_END)[0])
+    path = grid_bfs((grid == GRID_OBSTACLE).astype(np.uint8), start, end)
+    return None if path is None else len(path) - 1
+
+def _check(grid, status, directions, optimal):
+    """(valid, optimal) flags of one outcome against the reference."""
+    if status == 'no_path':
+        return optimal is None, None
+    if status != 'ok':
+        return None, None
+    return check_path(grid, directions), optimal is not None and len(directions) == optimal
+
+def run_suite(mazes=('random', 'spiral', 'dead_end'), sizes=(10, 25, 50, 100, 200),
+              densities=(0.1, 0.2, 0.3), planners=tuple(PLANNERS), timeout=5., seed=0):
+    """Run every planner on every (maze, size, density) and return one
+       row dict per run. Paths are checked against a BFS reference for
+       validity and optimality (shortest length)."""
+    rows = []
+    for kind in mazes:
+        for size in sizes:
+            for density in densities:
+                grid = GENERATORS[kind](size, density, seed)
+                optimal = _reference(grid)
+
+                for name in planners:
+                    status, seconds, peak, directions = run_planner(name, grid, timeout)
+                    valid, is_optimal = _check(grid, status, directions, optimal)
+
+                    row = {
+                        'maze': kind, 'rows': grid.shape[0], 'cols': grid.shape[1],
+                        'density': density, 'planner': name, 'status': status,
+                        'seconds': seconds, 'peak_kib': None if peak is None else peak / 1024,
+                        'length': None if directions is None else len(directions),
+                        'optimal_length': optimal, 'valid': valid,
+                        'optimal': None if directions is None else is_optimal,
+                    }
+                    rows.append(row)
+                    print(f'{kind:<9}{grid.shape[0]:>4}x{grid.shape[1]:<4}{density:>5}  '
+                          f'{name:<22}{status:<16}'
+                          + (f'{seconds * 1000:10.2f}ms' if seconds is not None else ' ' * 12)
+                          + (f'{peak / 1024:10.1f}KiB' if peak is not None else '')
+                          + ('' if valid is not False else '  INVALID')
+                          + ('' if row['optimal'] is not False else '  suboptimal'))
+    return rows
+
+def run_replanning(sequences, planners=REPLANNERS, timeout=30.):
+    """Per-frame planning cost over sequences of grids, e.g. from
+       drifting_sequence or a recording. `sequences` maps a label to an
+       array (frames, rows, cols); each planner solves every frame with
+       one instance, so IncrementalDodger repairs the previous plan
+       while the GridDodgers re-solve from scratch. Return one row dict
+       per (sequence, planner) with the mean time per frame and the
+       number of frames solved, valid and optimal."""
+    rows = []
+    for label, grids in sequences.items():
+        optimal = [_reference(grid) for grid in grids]
+        for name in planners:
+            status, seconds, peak, outcomes = run_sequence(name, grids, timeout)
+            checks = [_check(grid, *outcome, length) for grid, outcome, length
+                      in zip(grids, outcomes or [], optimal)]
+            row = {
+                'sequence': label, 'frames': len(grids), 'rows': grids.shape[1],
+                'cols': grids.shape[2], 'planner': name, 'status': status,
+                'us_per_frame': None if outcomes is None else seconds / len(grids) * 1e6,
+                'peak_kib': None if peak is None else peak / 1024,
+                'solved': sum(outcome[0] == 'ok' for outcome in outcomes or []),
+                'valid': sum(valid is True for valid, _ in checks),
+                'invalid': sum(valid is False for valid, _ in checks),
+                'optimal': sum(is_optimal is True for _, is_optimal in checks),
+            }
+            rows.append(row)
+            print(f'{label:<32}{name:<22}{status:<10}'
+                  + (f'{row["us_per_frame"]:10.1f}us/frame' if outcomes else ' ' * 18)
+                  + f'  solved {row["solved"]}/{len(grids)}'
+                  + ('' if not row['invalid'] else f'  INVALID {row["invalid"]}'))
+    return rows
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='') as writer:
+        table = csv.DictWriter(writer, fieldnames=list(rows[0]))
+        table.writeheader()
+        table.writerows(rows)
+
+def write_json(rows, path):
+    with open(path, 'w') as writer:
+        json.dump(rows, writer, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='planner benchmark and scaling suite')
+    parser.add_argument('--mazes', nargs='+', default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 25, 50, 100, 200])
+    parser.add_argument('--densities', nargs='+', type=float, default=[0.1, 0.2, 0.3])
+    parser.add_argument('--planners', nargs='+', default=None, choices=list(PLANNERS))
+    parser.add_argument('--timeout', type=float, default=5.)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--replan', action='store_true',
+                        help='time planners over drifting sequences instead of single mazes')
+    parser.add_argument('--moves', nargs='+', type=float, default=[0.05, 0.2])
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--recording', nargs='+', default=None,
+                        help='.npy or save_mazes files to replan over (implies --replan)')
+    parser.add_argument('--csv', default=None)
+    parser.add_argument('--json', default=None)
+    args = parser.parse_args()
+
+    if args.replan or args.recording:
+        if args.recording:
+            sequences = {path: load_sequence(path) for path in args.recording}
+        else:
+            sequences = {
+                f'{kind} {size} d={density} m={move}': drifting_sequence(
+                    GENERATORS[kind](size, density, args.seed), args.frames, move, args.seed)
+                for kind in args.mazes for size in args.sizes
+                for density in args.densities for move in args.moves}
+        rows = run_replanning(sequences, args.planners or REPLANNERS, args.timeout)
+        ok = all(not row['invalid'] for row in rows)
+    else:
+        rows = run_suite(args.mazes, args.sizes, args.densities,
+                         args.planners or tuple(PLANNERS), args.timeout, args.seed)
+        ok = all(row['valid'] is not False for row in rows)
+
+    if args.csv: write_csv(rows, args.csv)
+    if args.json: write_json(rows, args.json)
+    sys.exit(0 if ok else 1)
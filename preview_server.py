@@ -0,0 +1,121 @@
+import time
+import cv2
+from threading import Thread, Condition
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import utils
+
+
+_BOUNDARY = 'aidelframe'
+
+class PreviewServer(Thread):
+    """Opt-in MJPEG-over-HTTP preview. `publish` only keeps a reference
+       to the latest frame; JPEG encoding happens on this thread, at
+       most `max_fps` times per second and only while a client is
+       connected, so an idle preview costs nothing per frame."""
+
+    def __init__(self, host = '0.0.0.0', port = 8080, max_fps = 5, quality = 70):
+        Thread.__init__(self)
+        self.setDaemon(True)
+
+        self._interval = 1 / max_fps
+        self._params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self._cond = Condition()
+        self._frame = None
+        self._jpeg = None
+        self._seq = 0
+        self._clients = 0
+        self._running = True
+
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._server_thread = Thread(target = self._httpd.serve_forever)
+        self._server_thread.setDaemon(True)
+
+    def run(self):
+        self._server_thread.start()
+        utils.GLOBAL_LOGGER.info(
+            f'Preview server is listening on port {self._httpd.server_port}.')
+
+        while self._running:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: (self._clients and self._frame is not None)
+                    or not self._running)
+                frame, self._frame = self._frame, None
+
+            if frame is None: continue
+
+            ok, jpeg = cv2.imencode('.jpg', frame, self._params)
+            if ok:
+                with self._cond:
+                    self._jpeg = jpeg.tobytes()
+                    self._seq += 1
+                    self._cond.notify_all()
+
+            time.sleep(self._interval)
+
+    def publish(self, frame):
+        if not self._clients: return
+
+        with self._cond:
+            self._frame = frame
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _wait_jpeg(self, last_seq, timeout = 1):
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._seq != last_seq or not self._running, timeout)
+            return self._seq, self._jpeg
+
+    def _make_handler(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/stream.mjpg'):
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Content-Type',
+                    f'multipart/x-mixed-replace; boundary={_BOUNDARY}')
+                self.end_headers()
+
+                with server._cond:
+                    server._clients += 1
+                # 從目前的序號開始等待，還沒有影格時不會空轉
+                seq = server._seq
+                try:
+                    while server._running:
+                        new_seq, jpeg = server._wait_jpeg(seq)
+                        if new_seq == seq or jpeg is None: continue
+                        seq = new_seq
+
+                        self.wfile.write(f'--{_BOUNDARY}\r\n'.encode())
+                        self.wfile.write(b'Content-Type: image/jpeg\r\n')
+                        self.wfile.write(f'Content-Length: {len(jpeg)}\r\n\r\n'.encode())
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b'\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server._cond:
+                        server._clients -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return _Handler
+
+    @property
+    def has_clients(self):
+        return self._clients > 0
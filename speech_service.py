@@ -436,7 +436,8 @@ class Responser:
             utils.AUDIO_PLAYING = False
             self.play_audio(audio_name, callback)
 
-        while pygame.mixer.music.get_busy(): continue
+        # 播放期間讓出 GIL，避免與規劃執行緒搶 CPU
+        while pygame.mixer.music.get_busy(): pygame.time.wait(10)
 
         pygame.mixer.quit()
         if callable(callback): callback()
@@ -0,0 +1,149 @@
+import time
+import json
+from threading import Lock
+from collections import deque
+from contextlib import contextmanager
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies in microseconds.
+       Each power-of-two range is split into 2^(sub_bucket_bits - 1)
+       linear sub-buckets, so every recorded value is kept with a
+       relative error below 2^-(sub_bucket_bits - 1) while the memory
+       footprint stays fixed regardless of how many samples arrive."""
+
+    def __init__(self, sub_bucket_bits = 7, max_seconds = 60):
+        self._sub_bits = sub_bucket_bits
+        self._sub_count = 1 << sub_bucket_bits
+        self._max_value = int(max_seconds * 1e6)
+
+        bucket_count = max(1, self._max_value.bit_length() - sub_bucket_bits + 1)
+        self._counts = [0] * (bucket_count * self._sub_count)
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self._total = 0
+            self._sum = 0
+            self._min = None
+            self._max = 0
+
+    def _index(self, value):
+        exponent = max(0, value.bit_length() - self._sub_bits)
+        return exponent * self._sub_count + (value >> exponent)
+
+    def _value_at(self, index):
+        exponent, mantissa = divmod(index, self._sub_count)
+        lower = mantissa << exponent
+        return lower + ((1 << exponent) >> 1)
+
+    def record(self, seconds):
+        value = min(max(int(seconds * 1e6), 0), self._max_value)
+        with self._lock:
+            self._counts[self._index(value)] += 1
+            self._total += 1
+            self._sum += value
+            self._max = max(self._max, value)
+            self._min = value if self._min is None else min(self._min, value)
+
+    def percentile(self, p):
+        """Return the p-th percentile (0-100) in seconds."""
+        with self._lock:
+            if not self._total: return None
+
+            target = max(1, int(round(self._total * p / 100)))
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= target:
+                    return min(self._value_at(index), self._max) / 1e6
+
+        return self._max / 1e6
+
+    def summary(self, percentiles = (50, 95, 99)):
+        result = {'count': self._total}
+        if not self._total: return result
+
+        for p in percentiles:
+            result[f'p{p}'] = self.percentile(p)
+        result['mean'] = self._sum / self._total / 1e6
+        result['min'] = self._min / 1e6
+        result['max'] = self._max / 1e6
+        return result
+
+    @property
+    def count(self):
+        return self._total
+
+
+class Tracer:
+    """Collects per-stage latencies for the guidance loop. Stages are
+       timed with `span` (or `mark` for spans that start elsewhere);
+       each call updates the stage's histogram and, when a per-frame
+       `marks` dict is given, stores the (start, end) monotonic
+       timestamps there so individual frames can be inspected."""
+
+    def __init__(self, history = 256):
+        self._histograms = {}
+        self._lock = Lock()
+        self._recent = deque(maxlen = history)
+
+    def _histogram(self, stage):
+        with self._lock:
+            if stage not in self._histograms:
+                self._histograms[stage] = LatencyHistogram()
+            return self._histograms[stage]
+
+    def record(self, stage, seconds, marks = None):
+        self._histogram(stage).record(seconds)
+        if marks is not None:
+            end = time.monotonic()
+            marks[stage] = (end - seconds, end)
+
+    def mark(self, stage, start, marks = None):
+        end = time.monotonic()
+        self._histogram(stage).record(end - start)
+        if marks is not None:
+            marks[stage] = (start, end)
+
+    @contextmanager
+    def span(self, stage, marks = None):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.mark(stage, start, marks)
+
+    def finish(self, index, marks):
+        self._recent.append((index, dict(marks)))
+
+    def recent(self):
+        return list(self._recent)
+
+    def summary(self):
+        with self._lock:
+            stages = list(self._histograms.items())
+        return {stage: hist.summary() for stage, hist in stages}
+
+    def report(self):
+        lines = [f'{"stage":<18}{"count":>8}{"p50":>10}{"p95":>10}{"p99":>10}{"max":>10}']
+        for stage, s in self.summary().items():
+            if not s['count']: continue
+            lines.append(f'{stage:<18}{s["count"]:>8}' + ''.join(
+                f'{s[k] * 1000:>8.2f}ms' for k in ('p50', 'p95', 'p99', 'max')))
+        return '\n'.join(lines)
+
+    def dump(self, path = None):
+        """Return the latency report; if `path` is given the summary is
+           also written there as JSON."""
+        if path:
+            with open(path, 'w') as writer:
+                json.dump(self.summary(), writer, indent = 2)
+        return self.report()
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+        self._recent.clear()
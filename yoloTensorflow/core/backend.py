@@ -0,0 +1,88 @@
+import time
+import platform
+import numpy as np
+
+try:
+    # 裝置上只需要安裝 tflite_runtime，不必載入完整的 TensorFlow
+    from tflite_runtime.interpreter import Interpreter, load_delegate
+    from tflite_runtime import interpreter as _tflite
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
+    load_delegate = tf.lite.experimental.load_delegate
+    _tflite = tf.lite.experimental
+
+
+EDGETPU_SHARED_LIB = {
+    'Linux': 'libedgetpu.so.1',
+    'Darwin': 'libedgetpu.1.dylib',
+    'Windows': 'edgetpu.dll'
+}[platform.system()]
+
+BACKENDS = ('edgetpu', 'xnnpack', 'cpu')
+
+def make_interpreter(model_path, backend='xnnpack', num_threads=4):
+    """Create an allocated interpreter for one backend:
+       'edgetpu' loads the Coral delegate, 'xnnpack' is the CPU
+       interpreter with its default (XNNPACK) delegate, and 'cpu' is
+       the plain built-in kernels. Raise ValueError or OSError when the
+       backend is not usable on this machine."""
+    if backend == 'edgetpu':
+        interpreter = Interpreter(
+            model_path=model_path,
+            experimental_delegates=[load_delegate(EDGETPU_SHARED_LIB)])
+    elif backend == 'xnnpack':
+        interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+    elif backend == 'cpu':
+        resolver = getattr(_tflite, 'OpResolverType', None)
+        kwargs = {}
+        if resolver is not None:
+            kwargs['experimental_op_resolver_type'] = \
+                resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        interpreter = Interpreter(
+            model_path=model_path, num_threads=num_threads, **kwargs)
+    else:
+        raise ValueError(f'unknown backend {backend}.')
+
+    interpreter.allocate_tensors()
+    return interpreter
+
+def benchmark(interpreter, runs=5, warmup=1):
+    """Median seconds per invoke() on a zero input."""
+    detail = interpreter.get_input_details()[0]
+    interpreter.set_tensor(
+        detail['index'], np.zeros(detail['shape'], dtype=detail['dtype']))
+
+    for _ in range(warmup):
+        interpreter.invoke()
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        interpreter.invoke()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def select_backend(model_path, backend='auto', num_threads=4, runs=5):
+    """Return (name, interpreter, seconds_per_frame). With 'auto' every
+       usable backend is benchmarked and the fastest one is kept;
+       otherwise only the requested backend is built and measured."""
+    candidates = BACKENDS if backend == 'auto' else (backend,)
+
+    best = None
+    for name in candidates:
+        try:
+            interpreter = make_interpreter(model_path, name, num_threads)
+        except (ValueError, OSError, RuntimeError) as err:
+            if backend != 'auto': raise
+            print(f'Backend {name} is not available: {err}')
+            continue
+
+        latency = benchmark(interpreter, runs) if runs else 0.
+        print(f'Backend {name}: {latency * 1000:.1f}ms per frame')
+        if best is None or latency < best[2]:
+            best = (name, interpreter, latency)
+
+    if best is None:
+        raise RuntimeError('no TFLite backend could load the model.')
+    return best
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def filter_boxes(box_xywh, scores, score_threshold=0.4, input_shape=(416, 416)):
+    """NumPy port of yolov4.filter_boxes: drop boxes whose best class
+       score is below the threshold and convert (x, y, w, h) in input
+       pixels to normalized (y_min, x_min, y_max, x_max)."""
+    scores_max = np.max(scores, axis=-1)
+
+    mask = scores_max >= score_threshold
+    class_boxes = box_xywh[mask].reshape(scores.shape[0], -1, box_xywh.shape[-1])
+    pred_conf = scores[mask].reshape(scores.shape[0], -1, scores.shape[-1])
+
+    box_yx = class_boxes[..., 1::-1]
+    box_hw = class_boxes[..., 3:1:-1]
+    input_shape = np.asarray(input_shape, dtype=np.float32)
+
+    box_mins = (box_yx - (box_hw / 2.)) / input_shape
+    box_maxes = (box_yx + (box_hw / 2.)) / input_shape
+    boxes = np.concatenate([box_mins, box_maxes], axis=-1)
+    return boxes, pred_conf
+
+def nms(boxes, scores, iou_threshold, max_output_size):
+    """Greedy single-class NMS over (y_min, x_min, y_max, x_max) boxes.
+       Return the indices of the kept boxes in descending score order."""
+    order = np.argsort(-scores, kind='stable')
+    y1, x1, y2, x2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (y2 - y1) * (x2 - x1)
+
+    keep = []
+    while order.size and len(keep) < max_output_size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter = h * w
+        union = areas[i] + areas[rest] - inter
+        iou = np.where(union > 0, inter / np.maximum(union, 1e-12), 0.)
+        order = rest[iou <= iou_threshold]
+
+    return np.asarray(keep, dtype=int)
+
+def combined_non_max_suppression(boxes, scores, max_output_size_per_class,
+                                 max_total_size, iou_threshold=0.5,
+                                 score_threshold=float('-inf'),
+                                 pre_nms_top_k=None, clip_boxes=True):
+    """NumPy equivalent of tf.image.combined_non_max_suppression.
+       `boxes` is [batch, N, 4] (or [batch, N, 1, 4]), `scores` is
+       [batch, N, classes]. `pre_nms_top_k` keeps only the k best
+       (box, class) candidates before NMS. Outputs are padded to
+       `max_total_size` just like the TensorFlow op."""
+    boxes = boxes.reshape(boxes.shape[0], -1, 4)
+    batch = boxes.shape[0]
+
+    out_boxes = np.zeros((batch, max_total_size, 4), dtype=np.float32)
+    out_scores = np.zeros((batch, max_total_size), dtype=np.float32)
+    out_classes = np.zeros((batch, max_total_size), dtype=np.float32)
+    valid = np.zeros((batch,), dtype=np.int32)
+
+    for b in range(batch):
+        box_idx, cls_idx = np.nonzero(scores[b] > score_threshold)
+        cand_scores = scores[b][box_idx, cls_idx]
+
+        if pre_nms_top_k and cand_scores.size > pre_nms_top_k:
+            top = np.argpartition(-cand_scores, pre_nms_top_k - 1)[:pre_nms_top_k]
+            box_idx, cls_idx, cand_scores = box_idx[top], cls_idx[top], cand_scores[top]
+
+        sel_boxes, sel_scores, sel_classes = [], [], []
+        for c in np.unique(cls_idx):
+            m = cls_idx == c
+            cls_boxes = boxes[b][box_idx[m]]
+            keep = nms(cls_boxes, cand_scores[m], iou_threshold, max_output_size_per_class)
+            sel_boxes.append(cls_boxes[keep])
+            sel_scores.append(cand_scores[m][keep])
+            sel_classes.append(np.full(keep.size, c))
+
+        if not sel_scores: continue
+
+        sel_boxes = np.concatenate(sel_boxes)
+        sel_scores = np.concatenate(sel_scores)
+        sel_classes = np.concatenate(sel_classes)
+        order = np.argsort(-sel_scores, kind='stable')[:max_total_size]
+        n = order.size
+
+        out_boxes[b, :n] = sel_boxes[order]
+        out_scores[b, :n] = sel_scores[order]
+        out_classes[b, :n] = sel_classes[order]
+        valid[b] = n
+
+    if clip_boxes:
+        np.clip(out_boxes, 0., 1., out=out_boxes)
+    return out_boxes, out_scores, out_classes, valid
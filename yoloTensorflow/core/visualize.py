@@ -0,0 +1,102 @@
+import cv2
+import random
+import colorsys
+from functools import lru_cache
+from .config import cfg
+
+@lru_cache(maxsize=None)
+def read_class_names(class_file_name=cfg.YOLO.CLASSES):
+    names = {}
+    with open(class_file_name, 'r') as data:
+        for ID, name in enumerate(data):
+            names[ID] = name.strip('\n')
+    return names
+
+def class_colors(num_classes):
+    """The shuffled HSV palette used for boxes, as RGB tuples."""
+    hsv_tuples = [(1.0 * x / num_classes, 1., 1.) for x in range(num_classes)]
+    colors = list(map(lambda x: colorsys.hsv_to_rgb(*x), hsv_tuples))
+    colors = list(map(lambda x: (int(x[0] * 255), int(x[1] * 255), int(x[2] * 255)), colors))
+
+    rng = random.Random(0)
+    rng.shuffle(colors)
+    return colors
+
+def extract_objects(bboxes, shape, classes=None):
+    """Convert the NMS output [boxes, scores, classes, valid] with
+       normalized (y_min, x_min, y_max, x_max) boxes into a list of
+       (class_name, score, (left, top, right, bottom)) in pixels."""
+    classes = read_class_names() if classes is None else classes
+    image_h, image_w = shape[:2]
+
+    out_boxes, out_scores, out_classes, num_boxes = bboxes
+    n = int(num_boxes[0])
+    class_ids = out_classes[0][:n].astype(int)
+    coors = (out_boxes[0][:n] * (image_h, image_w, image_h, image_w)).astype(int)
+
+    objs = []
+    for coor, score, class_ind in zip(coors, out_scores[0][:n], class_ids):
+        if class_ind < 0 or class_ind >= len(classes): continue
+        objs.append((classes[class_ind], round(score, 2),
+                (int(coor[1]), int(coor[0]), int(coor[3]), int(coor[2]))))
+    return objs
+
+
+class BoxRenderer:
+    """Draws detections produced by extract_objects onto BGR frames.
+       Colors are computed once per class and label sizes once per
+       (class, thickness), so per-frame work is only the OpenCV calls."""
+
+    def __init__(self, classes=None, show_label=True, font_scale=0.5):
+        self.classes = read_class_names() if classes is None else classes
+        self.show_label = show_label
+        self.font_scale = font_scale
+
+        names = [self.classes[i] for i in range(len(self.classes))]
+        # 調色盤為 RGB，影格為 BGR
+        self._colors = {name: color[::-1] for name, color in
+                        zip(names, class_colors(len(names)))}
+        self._label_sizes = {}
+
+    def _label_size(self, cls_name, thick):
+        key = (cls_name, thick)
+        if key not in self._label_sizes:
+            # 分數固定為 "0.00" 格式，數字寬度相同，可以預先量好
+            self._label_sizes[key] = cv2.getTextSize(
+                f'{cls_name}: 0.00', 0, self.font_scale, thickness=thick // 2)[0]
+        return self._label_sizes[key]
+
+    def draw(self, image, objs):
+        """Draw `objs` on `image` in place and return it."""
+        image_h, image_w = image.shape[:2]
+        bbox_thick = int(0.6 * (image_h + image_w) / 600)
+
+        for cls_name, score, (l, t, r, b) in objs:
+            bbox_color = self._colors.get(cls_name, (255, 255, 255))
+            c1, c2 = (l, t), (r, b)
+            cv2.rectangle(image, c1, c2, bbox_color, bbox_thick)
+
+            if self.show_label:
+                t_size = self._label_size(cls_name, bbox_thick)
+                c3 = (c1[0] + t_size[0], c1[1] - t_size[1] - 3)
+                cv2.rectangle(image, c1, c3, bbox_color, -1) #filled
+
+                cv2.putText(image, f'{cls_name}: {score:.2f}', (c1[0], c1[1] - 2),
+                            cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (0, 0, 0),
+                            bbox_thick // 2, lineType=cv2.LINE_AA)
+        return image
+
+@lru_cache(maxsize=None)
+def _renderer(show_label):
+    return BoxRenderer(show_label=show_label)
+
+def draw_bbox(image, bboxes, classes=None, show_label=True, draw=True):
+    """Kept for the training scripts: extract the objects from `bboxes`
+       and, if `draw`, draw them on `image` (colors as RGB)."""
+    objs = extract_objects(bboxes, image.shape, classes)
+    if draw:
+        renderer = _renderer(show_label) if classes is None \
+            else BoxRenderer(classes, show_label)
+        image = cv2.cvtColor(renderer.draw(
+            cv2.cvtColor(image, cv2.COLOR_RGB2BGR), objs), cv2.COLOR_BGR2RGB)
+    return image, objs
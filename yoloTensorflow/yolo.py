@@ -1,24 +1,19 @@
 import os
+import time
+import queue
+import itertools
+import threading
 import numpy as np
 import cv2
-import tensorflow as tf
-import platform
-from PIL import Image
+from threading import Thread
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from .core.utils import draw_bbox
-from .core.yolov4 import filter_boxes
-
-
-physical_devices = tf.config.experimental.list_physical_devices('GPU')
-if len(physical_devices) > 0:
-    tf.config.experimental.set_memory_growth(physical_devices[0], True)
+from .core.visualize import read_class_names, extract_objects, BoxRenderer
+from .core.postprocess import filter_boxes, combined_non_max_suppression
+from .core.backend import select_backend
 
 ROOT_PATH = os.path.dirname(os.path.realpath(__file__))
-EDGETPU_SHARED_LIB = {
-    'Linux': 'libedgetpu.so.1',
-    'Darwin': 'libedgetpu.1.dylib',
-    'Windows': 'edgetpu.dll'
-}[platform.system()]
 
 class YOLO:
     _defaults = {
@@ -28,67 +23,354 @@ class YOLO:
         'model': 'yolov4',
         'score': 0.3,
         'iou': 0.45,
-        'model_image_size': (416, 416)
+        'model_image_size': (416, 416),
+        'roi': None,  # (left, top, right, bottom) as fractions of the frame
+        'letterbox': False,
+        'pre_nms_top_k': None,
+        'backend': 'auto',  # 'auto', 'edgetpu', 'xnnpack' or 'cpu'
+        'num_threads': 4,
+        'benchmark_runs': 5
     }
 
     def __init__(self, **kwargs):
         self.__dict__.update(self._defaults)  # set up default values
         self.__dict__.update(kwargs)  # and update with user overrides
 
-        interpreter = tf.lite.Interpreter(
-            model_path=self.model_path,
-            experimental_delegates=[
-                tf.lite.experimental.load_delegate(EDGETPU_SHARED_LIB)])
+        self.backend, interpreter, self.backend_latency = select_backend(
+            self.model_path, backend=self.backend,
+            num_threads=self.num_threads, runs=self.benchmark_runs)
+        print(f'Using {self.backend} backend '
+              f'({self.backend_latency * 1000:.1f}ms per frame)')
 
-        interpreter.allocate_tensors()
         self.input_details = interpreter.get_input_details()
         self.output_details = interpreter.get_output_details()
         print(self.input_details)
         print(self.output_details)
 
         self.interpreter = interpreter
+        self.last_timings = {}
+        self.classes = read_class_names()
+        self._renderer = None  # 需要繪圖時才建立
+        self._init_input()
+
+    def _init_input(self):
+        detail = self.input_details[0]
+        scale, zero_point = detail.get('quantization', (0., 0))
+        iw, ih = self.model_image_size
+
+        self._input_index = detail['index']
+        self._input_dtype = np.dtype(detail['dtype'])
+        self._input_quant = (scale, zero_point)
+        self._resized = np.full((ih, iw, 3), 128, dtype=np.uint8)
+        self._transform = None
 
-    def detect_image(self, image):
-        input_size = self.model_image_size
+    def detect_image(self, image, draw=True):
+        t0 = time.perf_counter()
+        bounds, transform = self.preprocess(image)
+        t1 = time.perf_counter()
+        pred = self.infer()
+        t2 = time.perf_counter()
+        pred_bbox = self.postprocess(pred, bounds, transform, image.shape)
+        t3 = time.perf_counter()
+        self.last_timings = {
+            'preprocess': t1 - t0, 'inference': t2 - t1, 'postprocess': t3 - t2}
 
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image_data = cv2.resize(image, input_size)
-        image_data = image_data / 255.
-        images_data = [image_data]
-        images_data = np.asarray(images_data).astype(np.float32)
+        return self.render(image, pred_bbox, draw=draw)
 
-        self.interpreter.set_tensor(
-            self.input_details[0]['index'], images_data)
+    def detect_batch(self, frames, draw=False):
+        """Run detect_image over `frames` in order on this interpreter and
+           return a list of (image, objs)."""
+        return [self.detect_image(frame, draw=draw) for frame in frames]
+
+    def preprocess(self, frame, out=None):
+        """Crop and resize `frame` into the input tensor, or into `out`
+           (an array shaped like the input tensor) when given. Return
+           the ROI bounds and crop transform needed by postprocess."""
+        bounds = self._roi_bounds(frame.shape)
+        x0, y0, x1, y1 = bounds
+        transform = self._set_input(
+            frame[y0:y1, x0:x1], self.model_image_size, out=out)
+        return bounds, transform
+
+    def infer(self, input_data=None):
+        """Run the interpreter, first copying `input_data` into the input
+           tensor if given, and return copies of the raw outputs."""
+        if input_data is not None:
+            self.interpreter.set_tensor(self._input_index, input_data)
         self.interpreter.invoke()
-        pred = [self.interpreter.get_tensor(self.output_details[i]['index'])
+        return [self.interpreter.get_tensor(self.output_details[i]['index'])
                 for i in range(len(self.output_details))]
+
+    def postprocess(self, pred, bounds, transform, shape):
+        input_shape = self.model_image_size[::-1]
         if self.model == 'yolov3' and self.tiny == True:
             boxes, pred_conf = filter_boxes(
-                pred[1], pred[0], score_threshold=0.25, input_shape=tf.constant([input_size]))
+                pred[1], pred[0], score_threshold=0.25, input_shape=input_shape)
         else:
             boxes, pred_conf = filter_boxes(
-                pred[0], pred[1], score_threshold=0.25, input_shape=tf.constant([input_size]))
+                pred[0], pred[1], score_threshold=0.25, input_shape=input_shape)
 
-        boxes, scores, classes, valid_detections = tf.image.combined_non_max_suppression(
-            boxes=tf.reshape(boxes, (tf.shape(boxes)[0], -1, 1, 4)),
-            scores=tf.reshape(
-                pred_conf, (tf.shape(pred_conf)[0], -1, tf.shape(pred_conf)[-1])),
+        boxes, scores, classes, valid_detections = combined_non_max_suppression(
+            boxes=boxes,
+            scores=pred_conf,
             max_output_size_per_class=50,
             max_total_size=50,
             iou_threshold=self.iou,
-            score_threshold=self.score
+            score_threshold=self.score,
+            pre_nms_top_k=self.pre_nms_top_k
         )
 
-        pred_bbox = [boxes.numpy(), scores.numpy(), classes.numpy(),
-                     valid_detections.numpy()]
-        image, objs = draw_bbox(image, pred_bbox)
-        image = Image.fromarray(image.astype(np.uint8))
-        image = cv2.cvtColor(np.array(image), cv2.COLOR_BGR2RGB)
+        pred_bbox = [boxes, scores, classes, valid_detections]
+        pred_bbox[0] = self._map_boxes(pred_bbox[0], transform, bounds, shape)
+        return pred_bbox
+
+    def render(self, frame, pred_bbox, draw=True):
+        """Return (image, objs). Drawing is skipped entirely unless
+           `draw`, in which case the boxes go on a copy of `frame`."""
+        objs = extract_objects(pred_bbox, frame.shape, self.classes)
+        image = frame
+        if draw:
+            if self._renderer is None:
+                self._renderer = BoxRenderer(self.classes)
+            image = self._renderer.draw(frame.copy(), objs)
 
         for o in objs: print(o)
 
         return image, objs
 
+    def _roi_bounds(self, shape):
+        h, w = shape[:2]
+        if not self.roi:
+            return 0, 0, w, h
+
+        l, t, r, b = self.roi
+        return int(l * w), int(t * h), int(r * w), int(b * h)
+
+    def _set_input(self, crop, input_size, out=None):
+        """Resize the BGR crop (stretched or letterboxed) straight into
+           the interpreter's input tensor (or `out`), swapping to RGB and scaling
+           to the model's input range in the same pass. Uint8 models
+           with a 1/255 input scale get the pixels as they are. Return
+           the (sx, sy, dx, dy) transform from crop to input pixels."""
+        iw, ih = input_size
+        h, w = crop.shape[:2]
+
+        if self.letterbox:
+            scale = min(iw / w, ih / h)
+            nw, nh = int(scale * w), int(scale * h)
+            dx, dy = (iw - nw) // 2, (ih - nh) // 2
+            transform = (scale, scale, dx, dy)
+            if transform != self._transform:
+                self._resized[...] = 128
+            self._resized[dy:dy + nh, dx:dx + nw] = cv2.resize(crop, (nw, nh))
+        else:
+            transform = (iw / w, ih / h, 0, 0)
+        self._transform = transform
+
+        # tensor() 回傳的是直接指向輸入張量的 view，invoke 前不可保留參照
+        if out is None:
+            tensor = self.interpreter.tensor(self._input_index)()[0]
+        else:
+            tensor = out[0]
+        q_scale, zero_point = self._input_quant
+        raw = abs(q_scale * 255 - 1) < 1e-3
+
+        if self._input_dtype == np.uint8 and raw and zero_point == 0:
+            if self.letterbox:
+                cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=tensor)
+            else:
+                cv2.resize(crop, input_size, dst=tensor)
+                cv2.cvtColor(tensor, cv2.COLOR_BGR2RGB, dst=tensor)
+            return transform
+
+        if not self.letterbox:
+            cv2.resize(crop, input_size, dst=self._resized)
+        rgb = self._resized[..., ::-1]
+
+        if self._input_dtype == np.float32:
+            np.multiply(rgb, 1 / 255., out=tensor, casting='unsafe')
+        elif self._input_dtype == np.int8 and raw and zero_point == -128:
+            np.subtract(rgb, 128, out=tensor, dtype=np.int16, casting='unsafe')
+        else:
+            info = np.iinfo(self._input_dtype)
+            tensor[...] = np.clip(
+                np.round(rgb / 255. / q_scale + zero_point), info.min, info.max)
+        return transform
+
+    def _map_boxes(self, boxes, transform, bounds, shape):
+        """Map normalized (ymin, xmin, ymax, xmax) boxes predicted on the
+           model input back to normalized coordinates of the full frame."""
+        if not self.roi and not self.letterbox:
+            return boxes
+
+        iw, ih = self.model_image_size
+        sx, sy, dx, dy = transform
+        x0, y0, x1, y1 = bounds
+        h, w = shape[:2]
+
+        ys = (boxes[..., 0::2] * ih - dy) / sy
+        xs = (boxes[..., 1::2] * iw - dx) / sx
+        ys = np.clip(ys, 0, y1 - y0) + y0
+        xs = np.clip(xs, 0, x1 - x0) + x0
+
+        mapped = np.empty_like(boxes)
+        mapped[..., 0::2] = ys / h
+        mapped[..., 1::2] = xs / w
+        return mapped
+
+class AsyncYOLO:
+    """Asynchronous front end for a YOLO instance. invoke() runs on a
+       dedicated thread while the caller preprocesses the next frame
+       into the second of two input buffers and postprocesses finished
+       results, so the three steps overlap. Once wrapped, the YOLO
+       instance must not be used synchronously."""
+
+    def __init__(self, yolo):
+        self._yolo = yolo
+        detail = yolo.input_details[0]
+        self._buffers = [np.empty(detail['shape'], dtype=detail['dtype'])
+                         for _ in range(2)]
+
+        self._free = queue.Queue()
+        for i in range(len(self._buffers)):
+            self._free.put(i)
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._next_ticket = 0
+        self._collected = 0
+
+        self._worker = Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None: break
+
+            ticket, index, frame, bounds, transform, draw = request
+            start = time.perf_counter()
+            pred = self._yolo.infer(self._buffers[index])
+            inference = time.perf_counter() - start
+            self._free.put(index)
+            self._results.put(
+                (ticket, pred, frame, bounds, transform, draw, inference))
+
+    def submit(self, frame, draw=True):
+        """Preprocess `frame` into a free input buffer and queue it for
+           inference. Blocks only while both buffers are in use. Return
+           a ticket identifying the frame."""
+        index = self._free.get()
+        bounds, transform = self._yolo.preprocess(frame, out=self._buffers[index])
+
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        self._requests.put((ticket, index, frame, bounds, transform, draw))
+        return ticket
+
+    def _finish(self, result):
+        ticket, pred, frame, bounds, transform, draw, inference = result
+        self._collected += 1
+        start = time.perf_counter()
+        pred_bbox = self._yolo.postprocess(pred, bounds, transform, frame.shape)
+        self._yolo.last_timings = {
+            'inference': inference, 'postprocess': time.perf_counter() - start}
+
+        image, objs = self._yolo.render(frame, pred_bbox, draw=draw)
+        return ticket, image, objs
+
+    def poll(self):
+        """Return (ticket, image, objs) for a finished frame, or None."""
+        try:
+            return self._finish(self._results.get_nowait())
+        except queue.Empty:
+            return None
+
+    def result(self, timeout=None):
+        """Block until the next frame finishes; return (ticket, image,
+           objs), or None on timeout."""
+        try:
+            return self._finish(self._results.get(timeout=timeout))
+        except queue.Empty:
+            return None
+
+    def pending(self):
+        """Number of submitted frames whose result was not taken yet."""
+        return self._next_ticket - self._collected
+
+    def close(self):
+        self._requests.put(None)
+        self._worker.join()
+
+_local = threading.local()
+
+def _init_worker(kwargs):
+    _local.yolo = YOLO(**kwargs)
+
+def _detect_in_worker(frame, draw):
+    image, objs = _local.yolo.detect_image(frame, draw=draw)
+    return (image if draw else None), objs
+
+
+class InterpreterPool:
+    """Pool of workers that each own a YOLO interpreter, for offline
+       processing of recordings faster than realtime. Worker processes
+       are used by default; threads also work because invoke() releases
+       the GIL. Each worker runs a single-threaded CPU interpreter
+       unless other YOLO options are passed."""
+
+    def __init__(self, workers=None, processes=True, **kwargs):
+        kwargs.setdefault('backend', 'xnnpack')
+        kwargs.setdefault('num_threads', 1)
+        kwargs.setdefault('benchmark_runs', 0)
+
+        self.workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self._executor = executor(
+            self.workers, initializer=_init_worker, initargs=(kwargs,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, trace):
+        self.close()
+
+    def detect_batch(self, frames, draw=False):
+        """Shard `frames` across the workers and return the list of
+           (image, objs) in input order; image is None unless `draw`."""
+        return list(self._executor.map(
+            _detect_in_worker, frames, itertools.repeat(draw)))
+
+    def detect_video(self, video_path, draw=False, window=None):
+        """Yield (frame_index, image, objs) for every frame of a video in
+           order, keeping at most `window` frames in flight."""
+        window = window or self.workers * 4
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise IOError(f"Couldn't open video {video_path}")
+
+        futures = deque()
+        index = 0
+        try:
+            while True:
+                ret, frame = capture.read()
+                if ret:
+                    futures.append((index, self._executor.submit(
+                        _detect_in_worker, frame, draw)))
+                    index += 1
+
+                while futures and (len(futures) >= window or not ret):
+                    i, future = futures.popleft()
+                    image, objs = future.result()
+                    yield i, image, objs
+
+                if not ret: break
+        finally:
+            capture.release()
+
+    def close(self):
+        self._executor.shutdown()
+
+
 def detect_realtime(yolo):
     capture = cv2.VideoCapture(0)
     capture.set(cv2.CAP_PROP_FRAME_WIDTH, 630)
@@ -104,13 +386,25 @@ def detect_realtime(yolo):
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
-def detect(yolo, frame):
-    image, objs = yolo.detect_image(frame)
+def detect(yolo, frame, draw=True):
+    image, objs = yolo.detect_image(frame, draw=draw)
     result = np.asarray(image)
 
     return result, objs
 
 
+def detect_offline(video_path, workers=None, **kwargs):
+    """Reprocess a recorded video with an InterpreterPool and return the
+       per-frame detections, printing the achieved throughput."""
+    start = time.perf_counter()
+    with InterpreterPool(workers, **kwargs) as pool:
+        results = [objs for _, _, objs in pool.detect_video(video_path)]
+    elapsed = time.perf_counter() - start
+    print(f'{len(results)} frames in {elapsed:.2f}s '
+          f'({len(results) / elapsed:.2f} FPS, {pool.workers} workers)')
+    return results
+
+
 if __name__ == '__main__':
     yolo = YOLO(
         model_path='data/yolov4-tiny-416.tflite', tiny=True)